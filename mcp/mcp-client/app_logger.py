@@ -194,6 +194,9 @@ def service_log_warning(msg, *args, **kwargs):
     if _global_logging_enabled: SERVICE_LOGGER.warning(msg, *args, **kwargs)
 def service_log_error(msg, *args, **kwargs):
     if _global_logging_enabled: SERVICE_LOGGER.error(msg, *args, **kwargs)
+def is_debug_enabled() -> bool:
+    """True if service debug records will be handled; guard costly debug messages with it."""
+    return _global_logging_enabled and SERVICE_LOGGER.isEnabledFor(LOG_LEVEL_VERBOSE)
 
 # For Engine
 def engine_log_debug(msg, *args, **kwargs):
@@ -15,6 +15,7 @@ from app_logger import (
 
 from config import AppConfig
 from engine import WorkflowEngine
+from services import ToolLoopError
 
 
 async def run_chat_loop(engine: WorkflowEngine):
@@ -40,6 +41,10 @@ async def run_chat_loop(engine: WorkflowEngine):
             response_text = await engine.process_user_query(query)
             print("\n" + response_text if response_text else "\n[No response from AI model]")
 
+        except ToolLoopError as e:
+            cli_log_warning(f"Query stopped by tool loop detection: {e}")
+            print(f"\n[Stopped: {e}. The conversation for this query was reset; try rephrasing it.]")
+
         except KeyboardInterrupt:
             cli_log_info("Chat loop interrupted by user (Ctrl+C).")
             print("\nQuery input interrupted. Type 'quit' to exit.")
@@ -166,7 +171,11 @@ async def main():
 
         if args.query:
             cli_log_info(f"Processing single query for workflow '{args.workflow_name}': '{args.query[:70]}...'")
-            response = await engine.process_user_query(args.query)
+            try:
+                response = await engine.process_user_query(args.query)
+            except ToolLoopError as e:
+                cli_log_warning(f"Query stopped by tool loop detection: {e}")
+                response = f"[Stopped: {e}.]"
             print(response) 
         else:
             await run_chat_loop(engine)
@@ -81,6 +81,17 @@ class AppConfig:
             config.setdefault("transportType", "stdio")
             if config["transportType"] != "stdio":
                 raise ValueError(f"Unsupported transportType for '{name}'.")
+            if "max_concurrent" in config:
+                # Used as a semaphore size: 0 would block every tool call forever
+                max_concurrent = config["max_concurrent"]
+                try:
+                    if isinstance(max_concurrent, bool):
+                        raise TypeError
+                    config["max_concurrent"] = int(max_concurrent)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Server '{name}' has a non-integer 'max_concurrent': {max_concurrent!r}.")
+                if config["max_concurrent"] < 1:
+                    raise ValueError(f"Server '{name}' 'max_concurrent' must be at least 1, got {max_concurrent!r}.")
         config_log_debug("MCP server configurations validated.")
 
 
@@ -1,17 +1,18 @@
-import traceback
-from typing import Dict, Any, List, Optional
+import asyncio
+import itertools
+from typing import Dict, Any, List, Optional, Tuple
 from contextlib import AsyncExitStack
 import json # <--- ADDED THIS LINE
 
 from google.genai import types as genai_types
 
 from config import AppConfig
-from services import MCPService, LLMService, Tool
+from services import MCPService, LLMService, Tool, ToolLoopError
 
 # Use the new logger
 from app_logger import (
     engine_log_debug, engine_log_info, engine_log_warning,
-    engine_log_error, engine_log_critical, engine_log_user
+    engine_log_error, engine_log_critical, engine_log_user, is_debug_enabled
 )
 
 class WorkflowEngine:
@@ -37,19 +38,34 @@ class WorkflowEngine:
         if not mcp_servers_to_use:
             engine_log_info(f"No MCP servers specified for workflow '{self.workflow_name}'.")
 
+        # Processes and sessions are started here, in this task, so close() can
+        # unwind them; the slow initialize/list_tools handshakes then run concurrently
+        pending_services: List[MCPService] = []
         for server_name in mcp_servers_to_use:
             server_cfg = self.app_config.get_mcp_server_config(server_name)
             service = MCPService(server_name, server_cfg, self.exit_stack)
             try:
-                await service.connect()
-                self.mcp_services[server_name] = service
-                current_server_tools = await service.get_tools()
-                engine_log_info(f"MCP Server '{server_name}' connected.",
-                                extra={"tools": [t.name for t in current_server_tools]})
-                self.all_mcp_tools.extend(current_server_tools)
+                await service.open_transport()
+                pending_services.append(service)
             except Exception as e:
                 engine_log_error(f"Failed to connect or setup MCP service '{server_name}' for workflow '{self.workflow_name}': {e}", exc_info=True)
-                raise # Or handle more gracefully, e.g., by allowing workflow to run with fewer tools
+
+        results = await asyncio.gather(*(service.initialize() for service in pending_services), return_exceptions=True)
+        for service, result in zip(pending_services, results):
+            server_name = service.server_name
+            if isinstance(result, BaseException):
+                engine_log_error(f"Failed to connect or setup MCP service '{server_name}' for workflow '{self.workflow_name}': {result}", exc_info=result)
+                continue
+            self.mcp_services[server_name] = service
+            current_server_tools = await service.get_tools()
+            service.genai_declarations = self.llm_service.build_function_declarations(current_server_tools)
+            engine_log_info(f"MCP Server '{server_name}' connected.",
+                            extra={"tools": [t.name for t in current_server_tools]})
+            self.all_mcp_tools.extend(current_server_tools)
+
+        failed_servers = [name for name in mcp_servers_to_use if name not in self.mcp_services]
+        if failed_servers:
+            engine_log_user(f"[Could not start MCP servers: {', '.join(failed_servers)}. Continuing without their tools.]")
 
         tool_names = [t.name for t in self.all_mcp_tools] if self.all_mcp_tools else ["None"]
         engine_log_user(f"Tools ready: {', '.join(tool_names)}.")
@@ -62,6 +78,18 @@ class WorkflowEngine:
              engine_log_error("MCP services not set up but workflow requires them. Call setup_services() first.")
              return "Error: Workflow services are not initialized."
 
+        # Sessions are set up once in setup_services and reused for every query;
+        # this only pings servers that have been idle for a while, all at once.
+        # A service without a session connects first, in this task (anyio cancel scopes).
+        services = list(self.mcp_services.values())
+        for mcp_service in services:
+            if mcp_service.session is None:
+                await mcp_service.ensure_connected()
+        results = await asyncio.gather(*(s.ensure_connected() for s in services), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
         initial_prompt = self.workflow_config["initial_prompt_template"].format(query=user_query)
         engine_log_debug(f"Initial prompt for LLM: {initial_prompt}")
         conversation_history: List[genai_types.Content] = [
@@ -71,100 +99,108 @@ class WorkflowEngine:
         final_response_parts = []
         max_turns = self.workflow_config.get("max_conversation_turns", 5)
 
-        llm_tool_config = self.llm_service.prepare_tools_for_llm(self.all_mcp_tools)
+        llm_tool_config = await self._prepare_llm_tool_config()
+        # Loop detection only looks at the tool calls made for this query
+        self.llm_service.reset_tool_call_history()
 
         for turn in range(max_turns):
             engine_log_info(f"Workflow '{self.workflow_name}', Turn {turn + 1}/{max_turns}")
             engine_log_debug(f"Conversation history length before LLM call: {len(conversation_history)}")
 
+            model_parts: List[genai_types.Part] = []
+            pending_text: List[str] = []
+            turn_text: List[str] = []
+            function_calls: List[Tuple[str, Dict[str, Any]]] = []
+            tool_tasks: List[asyncio.Task] = []
+            got_candidate = False
+
             try:
-                llm_response = await self.llm_service.generate_response(conversation_history, llm_tool_config)
+                async for chunk in self.llm_service.generate_response_stream(conversation_history, llm_tool_config):
+                    if not chunk.candidates or not chunk.candidates[0].content:
+                        continue
+                    got_candidate = True
+                    chunk_calls: List[Tuple[str, Dict[str, Any]]] = []
+                    debug_enabled = is_debug_enabled()
+                    for part in chunk.candidates[0].content.parts or ():
+                        if debug_enabled:
+                            engine_log_debug(f"Processing streamed part {len(model_parts) + 1} of LLM response: {part}")
+                        if part.function_call:
+                            fc = part.function_call
+                            tool_args = dict(fc.args) if fc.args else {}
+                            self.llm_service.check_tool_call(fc.name, tool_args)
+                            engine_log_user(f"LLM wants to call: {fc.name}({json.dumps(tool_args) if tool_args else ''})")
+                            engine_log_info(f"LLM requests tool call: '{fc.name}' with args: {tool_args}")
+                            chunk_calls.append((fc.name, tool_args))
+                            if pending_text:
+                                model_parts.append(genai_types.Part(text="".join(pending_text)))
+                                pending_text.clear()
+                            model_parts.append(part)
+                        elif part.text is not None:
+                            pending_text.append(part.text)
+                            turn_text.append(part.text)
+                        else:
+                            # Other part kinds (e.g. code execution) go back into history unchanged
+                            if pending_text:
+                                model_parts.append(genai_types.Part(text="".join(pending_text)))
+                                pending_text.clear()
+                            model_parts.append(part)
+                    if chunk_calls:
+                        # Start this chunk's calls while the rest of the response is still streaming
+                        function_calls.extend(chunk_calls)
+                        tool_tasks.append(asyncio.create_task(self._execute_tool_calls(chunk_calls)))
+            except ToolLoopError as e:
+                for task in tool_tasks:
+                    task.cancel()
+                engine_log_warning(f"Stopping workflow '{self.workflow_name}' query: {e}")
+                raise
             except Exception as e:
+                for task in tool_tasks:
+                    task.cancel()
                 err_msg = f"Error communicating with LLM in workflow '{self.workflow_name}': {e}"
                 engine_log_error(err_msg, exc_info=True)
                 engine_log_user(f"[Error communicating with AI model: {e}]") # User-facing
                 final_response_parts.append(f"\n[{err_msg}]")
                 break
 
-            if not llm_response.candidates:
+            if not got_candidate:
                 engine_log_warning(f"LLM returned no candidates for workflow '{self.workflow_name}'.")
                 engine_log_user("[AI model returned no response candidates.]") # User-facing
                 final_response_parts.append("\n[AI model returned no response candidates.]")
                 break
 
-            model_content = llm_response.candidates[0].content
+            # Text streamed in pieces is stored as one part, as a non-streamed response would have it
+            if pending_text:
+                model_parts.append(genai_types.Part(text="".join(pending_text)))
+            model_content = genai_types.Content(parts=model_parts, role="model")
             engine_log_debug(f"LLM response model_content (turn {turn+1}): {model_content}")
             conversation_history.append(model_content)
 
-            has_function_call = False
             text_from_llm_this_turn = []
-
-            for part_idx, part in enumerate(model_content.parts):
-                engine_log_debug(f"Processing part {part_idx+1} of LLM response: {part}")
-                if part.text:
-                    engine_log_info(f"LLM text (turn {turn+1}): '{part.text[:100]}...'")
-                    if part.text.strip():
-                        engine_log_user(f"LLM: {part.text.strip()}")
-                        text_from_llm_this_turn.append(part.text)
-
-                if part.function_call:
-                    has_function_call = True
-                    fc = part.function_call
-                    tool_name = fc.name
-                    tool_args = dict(fc.args) if fc.args else {}
-
-                    engine_log_user(f"LLM wants to call: {tool_name}({json.dumps(tool_args) if tool_args else ''})")
-                    engine_log_info(f"LLM requests tool call: '{tool_name}' with args: {tool_args}")
-
-                    tool_executed = False
-                    tool_result_for_llm: Dict[str, Any] = {}
-                    found_service_for_tool: Optional[MCPService] = None
-
-                    for service_name, mcp_service in self.mcp_services.items():
-                        service_tools = await mcp_service.get_tools()
-                        if any(t.name == tool_name for t in service_tools):
-                            found_service_for_tool = mcp_service
-                            engine_log_debug(f"Tool '{tool_name}' found in MCP service '{service_name}'.")
-                            break
-
-                    if found_service_for_tool:
-                        try:
-                            mcp_result = await found_service_for_tool.call_tool(tool_name, tool_args)
-                            result_snippet = str(mcp_result)[:150].replace('\n', ' ') + "..." if len(str(mcp_result)) > 150 else str(mcp_result)
-                            engine_log_user(f"Tool {tool_name} executed. Result snippet: {result_snippet}")
-                            engine_log_info(f"Tool '{tool_name}' executed by '{found_service_for_tool.server_name}'.")
-                            engine_log_debug(f"Full result from tool '{tool_name}': {mcp_result}")
-
-                            if isinstance(mcp_result, dict):
-                                tool_result_for_llm = mcp_result
-                            else:
-                                tool_result_for_llm = {"output": mcp_result}
-                            tool_executed = True
-                        except Exception as e:
-                            error_msg = f"Error executing MCP tool '{tool_name}' via '{found_service_for_tool.server_name}': {e}"
-                            engine_log_error(error_msg, exc_info=True)
-                            engine_log_user(f"[Error calling tool {tool_name}: {e}]")
-                            tool_result_for_llm = {"error": error_msg, "details": traceback.format_exc(limit=3)}
-                    else:
-                        error_msg = f"Tool '{tool_name}' requested by LLM but not found in any active MCP service for workflow '{self.workflow_name}'."
-                        engine_log_error(error_msg)
-                        engine_log_user(f"[Tool '{tool_name}' not found.]")
-                        tool_result_for_llm = {"error": error_msg}
-
-                    tool_response_part = genai_types.Part.from_function_response(
-                        name=tool_name, response=tool_result_for_llm
-                    )
+            llm_text = "".join(turn_text)
+            if llm_text:
+                engine_log_info(f"LLM text (turn {turn+1}): '{llm_text[:100]}...'")
+                if llm_text.strip():
+                    engine_log_user(f"LLM: {llm_text.strip()}")
+                    text_from_llm_this_turn.append(llm_text)
+
+            has_function_call = bool(function_calls)
+            if has_function_call:
+                # All calls are already running; they are answered in a single
+                # Content, in the order the model made them
+                batches = await asyncio.gather(*tool_tasks)
+                tool_results = [result for batch in batches for result in batch]
+                tool_response_parts = []
+                for (tool_name, _), tool_result_for_llm in zip(function_calls, tool_results):
                     engine_log_debug(f"Adding tool response for '{tool_name}' to history: {tool_result_for_llm}")
-                    conversation_history.append(genai_types.Content(parts=[tool_response_part], role="user"))
-                    break
+                    tool_response_parts.append(genai_types.Part.from_function_response(
+                        name=tool_name, response=tool_result_for_llm
+                    ))
+                conversation_history.append(genai_types.Content(parts=tool_response_parts, role="user"))
 
             if not has_function_call:
                 engine_log_info(f"No function call in LLM response (turn {turn+1}). Assuming final answer for workflow '{self.workflow_name}'.")
                 if text_from_llm_this_turn:
                     final_response_parts.extend(text_from_llm_this_turn)
-                elif not any(p.strip() for p in final_response_parts) and hasattr(llm_response, 'text') and llm_response.text and llm_response.text.strip():
-                    engine_log_user(f"LLM: {llm_response.text.strip()}")
-                    final_response_parts.append(llm_response.text)
 
                 if not final_response_parts or not any(p.strip() for p in final_response_parts):
                      engine_log_warning("LLM provided no text and no function call. Ending turn.")
@@ -182,7 +218,97 @@ class WorkflowEngine:
         engine_log_info(f"Final response for query: '{final_text_output[:100]}...'")
         return final_text_output
 
+    async def _prepare_llm_tool_config(self) -> Optional[genai_types.GenerateContentConfig]:
+        # Declarations are built once per service when it connects and only
+        # rebuilt (from the cached tool list) after a server's tools changed
+        for mcp_service in self.mcp_services.values():
+            if mcp_service.genai_declarations is None:
+                mcp_service.genai_declarations = self.llm_service.build_function_declarations(await mcp_service.get_tools())
+        return self.llm_service.prepare_tools_from_declarations(tuple(itertools.chain.from_iterable(
+            mcp_service.genai_declarations for mcp_service in self.mcp_services.values()
+        )))
+
+    async def _find_service_for_tool(self, tool_name: str) -> Optional[MCPService]:
+        for service_name, mcp_service in self.mcp_services.items():
+            service_tools = await mcp_service.get_tools()
+            if any(t.name == tool_name for t in service_tools):
+                engine_log_debug(f"Tool '{tool_name}' found in MCP service '{service_name}'.")
+                return mcp_service
+        return None
+
+    async def call_tools_batch_multi(self, spec: List[Tuple[str, str, Dict[str, Any]]]) -> List[Any]:
+        """
+        Runs (server_name, tool_name, args) calls grouped by server, with all
+        servers running in parallel. Results are returned in the order of
+        `spec`; a failed call yields the exception it raised.
+        """
+        calls_by_server: Dict[str, List[int]] = {}
+        for idx, (server_name, _, _) in enumerate(spec):
+            calls_by_server.setdefault(server_name, []).append(idx)
+
+        server_names = list(calls_by_server)
+        batches = await asyncio.gather(*(
+            self.mcp_services[server_name].call_tools_batch(
+                [(spec[idx][1], spec[idx][2]) for idx in calls_by_server[server_name]]
+            )
+            for server_name in server_names
+        ))
+
+        results: List[Any] = [None] * len(spec)
+        for server_name, batch in zip(server_names, batches):
+            for idx, result in zip(calls_by_server[server_name], batch):
+                results[idx] = result
+        return results
+
+    async def _execute_tool_calls(self, function_calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        tool_results: List[Dict[str, Any]] = [{} for _ in function_calls]
+        spec: List[Tuple[str, str, Dict[str, Any]]] = []
+        spec_indexes: List[int] = []
+
+        for idx, (tool_name, tool_args) in enumerate(function_calls):
+            found_service_for_tool = await self._find_service_for_tool(tool_name)
+            args_error = self.llm_service.validate_tool_args(tool_name, tool_args) if found_service_for_tool else None
+            if args_error:
+                error_msg = f"Invalid arguments for tool '{tool_name}': {args_error}"
+                engine_log_error(error_msg)
+                engine_log_user(f"[Invalid arguments for tool {tool_name}: {args_error}]")
+                tool_results[idx] = {"error": error_msg}
+            elif found_service_for_tool:
+                spec.append((found_service_for_tool.server_name, tool_name, tool_args))
+                spec_indexes.append(idx)
+            else:
+                error_msg = f"Tool '{tool_name}' requested by LLM but not found in any active MCP service for workflow '{self.workflow_name}'."
+                engine_log_error(error_msg)
+                engine_log_user(f"[Tool '{tool_name}' not found.]")
+                tool_results[idx] = {"error": error_msg}
+
+        if not spec:
+            return tool_results
+
+        mcp_results = await self.call_tools_batch_multi(spec)
+        for idx, (server_name, tool_name, _), mcp_result in zip(spec_indexes, spec, mcp_results):
+            if isinstance(mcp_result, BaseException):
+                error_msg = f"Error executing MCP tool '{tool_name}' via '{server_name}': {mcp_result}"
+                engine_log_error(error_msg, exc_info=mcp_result)
+                engine_log_user(f"[Error calling tool {tool_name}: {mcp_result}]")
+                # The traceback only goes to the log (exc_info above), not to the model
+                tool_results[idx] = {"error": error_msg}
+                continue
+
+            result_snippet = str(mcp_result)[:150].replace('\n', ' ') + "..." if len(str(mcp_result)) > 150 else str(mcp_result)
+            engine_log_user(f"Tool {tool_name} executed. Result snippet: {result_snippet}")
+            engine_log_info(f"Tool '{tool_name}' executed by '{server_name}'.")
+            engine_log_debug(f"Full result from tool '{tool_name}': {mcp_result}")
+
+            if isinstance(mcp_result, dict):
+                tool_results[idx] = mcp_result
+            else:
+                tool_results[idx] = {"output": mcp_result}
+        return tool_results
+
     async def close(self):
+        # One exit stack holds every service's transport and session; it must be
+        # closed from the task that ran setup_services (anyio cancel scopes)
         engine_log_info(f"Closing services for workflow: {self.workflow_name}")
         await self.exit_stack.aclose()
         engine_log_info(f"Workflow services closed for '{self.workflow_name}'.")
\ No newline at end of file
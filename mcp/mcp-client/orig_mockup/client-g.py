@@ -2,6 +2,8 @@ import asyncio
 from typing import Optional
 from contextlib import AsyncExitStack
 import os
+import hashlib
+import json
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -11,13 +13,21 @@ from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env
 
+def _tools_fingerprint(tools) -> str:
+    """Digest of the tool names, descriptions and input schemas the config is built from"""
+    payload = [(tool.name, tool.description, tool.inputSchema) for tool in tools]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
 class MCPClient:
     def __init__(self):
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
         self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-        self.chat = None  # Will be initialized in process_query
+        self.chat = None  # Created per query in process_query
+        # Generation settings are fixed; the full config is cached per tool set
+        self._base_config_kwargs = dict(temperature=0.1, max_output_tokens=1000)
+        self._config_cache = None  # (tools fingerprint, GenerateContentConfig)
 
     async def connect_to_server(self, server_script_path: str):
         """Connect to an MCP server
@@ -48,14 +58,8 @@ class MCPClient:
         tools = response.tools
         print("\nConnected to server with tools:", [tool.name for tool in tools])
 
-    async def process_query(self, query: str) -> str:
-        """Process a query using Gemini and available tools"""
-        # Initialize chat session if not already done
-        if self.chat is None:
-            self.chat = self.client.chats.create(model="gemini-2.0-flash")
-
-        # Get available tools from MCP session
-        response = await self.session.list_tools()
+    def _build_config(self, tools) -> types.GenerateContentConfig:
+        """Build the generation config declaring the given MCP tools"""
         available_tools = [
             types.Tool(
                 function_declarations=[
@@ -70,31 +74,47 @@ class MCPClient:
                     }
                 ]
             )
-            for tool in response.tools
+            for tool in tools
         ]
+        return types.GenerateContentConfig(tools=available_tools, **self._base_config_kwargs)
 
-        # Configure generation with tools
-        config = types.GenerateContentConfig(
-            tools=available_tools,
-            temperature=0.1,
-            max_output_tokens=1000
-        )
+    async def process_query(self, query: str) -> str:
+        """Process a query using Gemini and available tools"""
+        # Get available tools from MCP session
+        response = await self.session.list_tools()
+        fingerprint = _tools_fingerprint(response.tools)
+        if self._config_cache and self._config_cache[0] == fingerprint:
+            config = self._config_cache[1]
+        else:
+            config = self._build_config(response.tools)
+            self._config_cache = (fingerprint, config)
+
+        # Start a fresh chat for this query; the SDK keeps the history and only
+        # serializes the new turn on each send instead of the whole message list
+        self.chat = self.client.chats.create(model="gemini-2.0-flash", config=config)
 
         # Send initial query
-        messages = [types.Content(role="user", parts=[types.Part(text=query)])]
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=messages,
-            config=config
-        )
+        response = self.chat.send_message(query)
 
         # Process response and handle tool calls
         final_text = []
 
         while True:
-            # Check if response contains a function call
-            if response.candidates[0].content.parts and hasattr(response.candidates[0].content.parts[0], 'function_call') and response.candidates[0].content.parts[0].function_call:
-                function_call = response.candidates[0].content.parts[0].function_call
+            # Walk the parts once; Gemini may put function calls after a text part
+            parts = response.candidates[0].content.parts or ()
+            function_calls = []
+            for part in parts:
+                fc = getattr(part, "function_call", None)
+                if fc:
+                    function_calls.append(fc)
+
+            if not function_calls:
+                # No function call, append text response
+                final_text.extend(part.text for part in parts if part.text)
+                break
+
+            function_response_parts = []
+            for function_call in function_calls:
                 tool_name = function_call.name
                 tool_args = function_call.args
 
@@ -102,31 +122,13 @@ class MCPClient:
                 result = await self.session.call_tool(tool_name, tool_args)
                 final_text.append(f"[Calling tool {tool_name} with args {tool_args}]")
 
-                # Append function call and result to conversation history
-                messages.append(types.Content(
-                    role="model",
-                    parts=[types.Part(function_call=function_call)]
-                ))
-                function_response_part = types.Part.from_function_response(
+                function_response_parts.append(types.Part.from_function_response(
                     name=tool_name,
                     response={"result": result.content}
-                )
-                messages.append(types.Content(
-                    role="user",
-                    parts=[function_response_part]
                 ))
 
-                # Send updated conversation to Gemini
-                response = self.client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=messages,
-                    config=config
-                )
-            else:
-                # No function call, append text response
-                if response.candidates[0].content.parts:
-                    final_text.append(response.candidates[0].content.parts[0].text)
-                break
+            # The chat already recorded the model's function calls; send only the results
+            response = self.chat.send_message(function_response_parts)
 
         return "\n".join(final_text)
 
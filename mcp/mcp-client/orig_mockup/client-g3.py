@@ -5,25 +5,14 @@ from contextlib import AsyncExitStack
 import logging  # Add logging import
 import sys
 import traceback  # Add traceback import for detailed stack traces
+import json
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG for verbose output
-    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),  # Output to console
-        logging.FileHandler('client_debug.log')  # Save to a log file
-    ]
-)
-logger = logging.getLogger(__name__)
 
-load_dotenv()
+# google.genai, dotenv and the logging handlers are set up lazily so that
+# importing this module (or running --help) doesn't pay for them
+logger = logging.getLogger(__name__)
 
 DEFAULT_GEMINI_MODEL = "gemini-2.0-flash"
 
@@ -31,6 +20,7 @@ class MCPClient:
     def __init__(self):
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
+        from google import genai
         try:
             self.genai_client = genai.Client()
             logger.info("Google GenAI Client initialized successfully")
@@ -111,6 +101,7 @@ class MCPClient:
         }
 
     async def process_query(self, query: str) -> str:
+        from google.genai import types
         logger.debug(f"Processing query: {query}")
         try:
             mcp_tools_response = await self.session.list_tools()
@@ -161,6 +152,10 @@ class MCPClient:
         print(f"Using Gemini model: {DEFAULT_GEMINI_MODEL}")
         print("Type your queries or 'quit' to exit.")
 
+        if not sys.stdin.isatty():
+            await self._batch_query_loop()
+            return
+
         while True:
             try:
                 query = input("\nQuery: ").strip()
@@ -178,6 +173,47 @@ class MCPClient:
                 logger.error(f"Error in chat loop: {str(e)}", exc_info=True)
                 print(f"\nError in chat loop: {str(e)}")
 
+    async def _batch_query_loop(self, max_concurrency: int = 4):
+        """Process piped queries concurrently, printing results in submission order."""
+        logger.info(f"Non-interactive stdin, processing up to {max_concurrency} queries at once")
+        if not self.session:
+            logger.warning("No active session")
+            print("Not connected to any server. Please connect first.")
+            return
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Bounded so reading stdin stalls while too many results are waiting to be printed
+        pending: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+
+        async def run_query(query: str) -> str:
+            async with semaphore:
+                return await self.process_query(query)
+
+        async def print_results():
+            while (task := await pending.get()) is not None:
+                try:
+                    print("\n" + await task)
+                except Exception as e:
+                    logger.error(f"Error processing query: {str(e)}", exc_info=True)
+                    print(f"\nError in chat loop: {str(e)}")
+
+        printer = asyncio.create_task(print_results())
+        try:
+            while True:
+                line = await asyncio.to_thread(sys.stdin.readline)
+                if not line:  # EOF
+                    break
+                query = line.strip()
+                logger.debug(f"Received user query: {query}")
+                if query.lower() == 'quit':
+                    logger.info("User requested to quit")
+                    break
+                if query:
+                    await pending.put(asyncio.create_task(run_query(query)))
+        finally:
+            await pending.put(None)
+            await printer
+
     async def cleanup(self):
         logger.debug("Cleaning up MCP Client")
         if self.exit_stack:
@@ -185,8 +221,59 @@ class MCPClient:
         logger.info("MCP Client cleaned up.")
         print("MCP Client cleaned up.")
 
+class _OrjsonCodec:
+    """Stand-in for the json module that encodes and decodes with orjson.
+
+    Only dumps/loads without stdlib-only keyword arguments go through orjson;
+    everything else, including objects orjson can't encode, uses stdlib json.
+    """
+
+    def __init__(self, orjson_module):
+        self._orjson = orjson_module
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            try:
+                return self._orjson.dumps(obj).decode()
+            except TypeError:
+                pass
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return self._orjson.loads(s)  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+def use_orjson():
+    """Encode and decode the GenAI SDK's HTTP bodies with orjson if it's installed.
+
+    Request bodies and streamed response chunks are serialized by the SDK's
+    _api_client module, so only that module's `json` reference is replaced;
+    the stdlib json module and every other library keep their behavior. The
+    MCP client library already (de)serializes through pydantic-core. orjson
+    emits compact separators and writes NaN/Infinity as null.
+    """
+    try:
+        import orjson
+        from google.genai import _api_client
+    except ImportError:
+        logger.debug("orjson not installed, keeping stdlib json")
+        return
+    if isinstance(getattr(_api_client, "json", None), _OrjsonCodec):
+        return
+    if getattr(_api_client, "json", None) is not json:
+        logger.debug("GenAI SDK does not use the json module as expected, keeping stdlib json")
+        return
+    _api_client.json = _OrjsonCodec(orjson)
+    logger.debug("Using orjson for GenAI request and response bodies")
+
 async def main():
     logger.info("Starting main function")
+    if os.getenv("MCP_USE_ORJSON") == "1":
+        use_orjson()
     if len(sys.argv) < 2:
         logger.error("No server script path provided")
         print("Usage: python client.py <path_to_server_script>")
@@ -212,6 +299,19 @@ async def main():
         await client.cleanup()
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    # Configure logging
+    logging.basicConfig(
+        level=logging.DEBUG,  # Set to DEBUG for verbose output
+        format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),  # Output to console
+            logging.FileHandler('client_debug.log')  # Save to a log file
+        ]
+    )
+    load_dotenv()
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -1,67 +1,223 @@
 import asyncio
 import os
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from contextlib import AsyncExitStack
+from collections import OrderedDict
 import logging
+import logging.handlers
 import sys
 import traceback
 import json
+import hashlib
 from pathlib import Path
-import argparse
 
 from mcp import ClientSession, StdioServerParameters
+from mcp import types as mcp_types
 from mcp.client.stdio import stdio_client
 from google import genai
 from google.genai import types
-from dotenv import load_dotenv
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('client_debug.log')
-    ]
-)
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; stdlib json accepts bytes too
+    _json_loads = json.loads
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError; ijson has its own error type
+_JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError) if ijson is not None else (json.JSONDecodeError,)
+
+def _schema_digest(schema: Any) -> str:
+    """Stable digest of a tool input schema, for telling tool lists apart cheaply."""
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+def configure_logging(log_file: str = 'client_debug.log'):
+    """Log to stdout and log_file; applications importing this module can configure their own logging instead."""
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    # Batch file writes in memory, flushing immediately on errors; DEBUG only goes to the file with MCP_DEBUG=1
+    buffered_file_handler = logging.handlers.MemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=file_handler)
+    buffered_file_handler.setLevel(logging.DEBUG if os.getenv("MCP_DEBUG") == "1" else logging.INFO)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            buffered_file_handler
+        ]
+    )
 
 DEFAULT_GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
 
+# Same invariants as ConfigManager._check_config, compiled once when fastjsonschema is installed
+_MCP_CONFIG_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["mcpServers"],
+    "properties": {
+        "mcpServers": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "object",
+                "required": ["command", "args"],
+                "properties": {
+                    "args": {"type": "array"},
+                    "transportType": {"enum": ["stdio"]},
+                    "env": {"type": "object"},
+                },
+            },
+        },
+    },
+}
+
+try:
+    import fastjsonschema
+    _validate_mcp_config = fastjsonschema.compile(_MCP_CONFIG_SCHEMA)
+except ImportError:
+    _validate_mcp_config = None
+
+# JSON schema types GenAI accepts for tool parameters; anything else falls back to string
+_VALID_JSON_TYPES = frozenset({"string", "number", "integer", "boolean", "array", "object"})
+_DEFAULT_JSON_TYPE = "string"
+
+# Configs larger than this only have their mcpServers object streamed in (needs ijson)
+_STREAM_CONFIG_THRESHOLD = 64 * 1024
+
+# Parsed and validated configs keyed by (absolute path, mtime_ns, size), shared by every ConfigManager
+_CONFIG_CACHE: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
+# (cwd, discovered config path) from the last successful search, so later ConfigManagers skip the
+# probes. Misses aren't kept, so a config created later is still picked up.
+_DISCOVERED_CONFIG: Optional[Tuple[Path, Path]] = None
+
+def reset_config_discovery():
+    """Forget the discovered config path, e.g. after moving or removing an mcp.json."""
+    global _DISCOVERED_CONFIG
+    _DISCOVERED_CONFIG = None
+
+# Live server sessions shared by MCPClients in this process, least recently used first. With
+# MCP_SERVER_POOL_SIZE > 0 up to that many idle servers stay running after their last client
+# cleans up, until evicted or close_server_pool(); the default of 0 closes them right away.
+# Entries must be opened and closed from the same task (anyio cancel scopes), e.g. main().
+# Read when evicting rather than at import, so a value from .env still applies.
+def _server_pool_size() -> int:
+    return int(os.getenv("MCP_SERVER_POOL_SIZE", "0"))
+
+class _PooledServer:
+    """A connected server session and the MCPClients currently using it."""
+
+    def __init__(self, session: ClientSession, exit_stack: AsyncExitStack):
+        self.session = session
+        self.exit_stack = exit_stack
+        self.clients: List["MCPClient"] = []
+
+    async def handle_message(self, message: Any) -> None:
+        for client in self.clients:
+            await client._handle_server_message(message)
+
+_SERVER_POOL: "OrderedDict[Tuple[Any, ...], _PooledServer]" = OrderedDict()
+
+def _server_pool_key(server_params: StdioServerParameters) -> Tuple[Any, ...]:
+    return (server_params.command, tuple(server_params.args), frozenset((server_params.env or {}).items()))
+
+async def _close_pooled_server(key: Tuple[Any, ...]):
+    entry = _SERVER_POOL.pop(key)
+    try:
+        await entry.exit_stack.aclose()
+    except Exception as e:
+        logger.error(f"Error closing pooled server {key[0]} {list(key[1])}: {str(e)}", exc_info=True)
+
+async def _evict_idle_servers():
+    """Close least recently used idle sessions until the pool is back within its size."""
+    pool_size = _server_pool_size()
+    for key in [key for key, entry in _SERVER_POOL.items() if not entry.clients]:
+        if len(_SERVER_POOL) <= pool_size:
+            break
+        logger.debug("Evicting pooled server %s", key[0])
+        await _close_pooled_server(key)
+
+async def close_server_pool():
+    """Close every pooled server session."""
+    for key in list(_SERVER_POOL):
+        await _close_pooled_server(key)
+
 class ConfigManager:
-    def __init__(self, config_path: Optional[str] = None):
+    def __init__(self, config_path: Optional[str] = None, validate: Optional[bool] = None):
         self.config: Dict[str, Any] = {}
-        self.config_path = config_path or self._find_config_path()
+        self.config_path: Optional[Path] = Path(config_path) if config_path else self._find_config_path()
+        # Trusted configs can skip validation with MCP_CONFIG_VALIDATE=loose
+        self.validate = validate if validate is not None else os.getenv("MCP_CONFIG_VALIDATE", "strict") != "loose"
         self.load_config()
 
-    def _find_config_path(self) -> str:
+    def _find_config_path(self) -> Optional[Path]:
         """Search for mcp.json or .mcp.json in standard locations."""
+        global _DISCOVERED_CONFIG
+        cwd = Path.cwd()
+        if _DISCOVERED_CONFIG is not None and _DISCOVERED_CONFIG[0] == cwd:
+            return _DISCOVERED_CONFIG[1]
+        # One directory listing per location instead of a stat per candidate name
         possible_paths = [
-            Path.cwd() / ".mcp.json",
-            Path.cwd() / "mcp.json",
-            Path.home() / ".mcp" / "mcp.json",
+            (cwd, (".mcp.json", "mcp.json")),
+            (Path.home() / ".mcp", ("mcp.json",)),
         ]
-        for path in possible_paths:
-            if path.exists():
-                logger.debug(f"Found configuration file at {path}")
-                return str(path)
-        logger.warning("No mcp.json or .mcp.json found. Using default configuration.")
-        return ""
+        found = None
+        for directory, names in possible_paths:
+            try:
+                with os.scandir(directory) as entries:
+                    files = {entry.name for entry in entries if entry.is_file()}
+            except OSError:
+                continue
+            found = next((directory / name for name in names if name in files), None)
+            if found:
+                break
+        if found:
+            logger.debug(f"Found configuration file at {found}")
+            _DISCOVERED_CONFIG = (cwd, found)
+        else:
+            logger.warning("No mcp.json or .mcp.json found. Using default configuration.")
+        return found
 
     def load_config(self):
         """Load and validate the configuration file."""
-        if not self.config_path or not Path(self.config_path).exists():
+        try:
+            f = open(self.config_path, 'rb') if self.config_path else None
+        except FileNotFoundError:
+            f = None
+        if f is None:
             logger.debug("No configuration file provided or found.")
             return
 
         try:
-            with open(self.config_path, 'r') as f:
-                self.config = json.load(f)
-            self._validate_config()
+            with f:
+                st = os.fstat(f.fileno())
+                cache_key = (os.path.abspath(self.config_path), st.st_mtime_ns, st.st_size)
+                cached_config = _CONFIG_CACHE.get(cache_key)
+                if cached_config is not None:
+                    self.config = cached_config
+                    logger.debug(f"Using cached configuration for {self.config_path}")
+                    return
+                servers = None
+                if ijson is not None and st.st_size > _STREAM_CONFIG_THRESHOLD:
+                    servers = dict(ijson.kvitems(f, "mcpServers", use_float=True))
+                # kvitems yields nothing for a missing or non-object mcpServers as well as an
+                # empty one; parse the whole file then so validation reports it like a small one
+                if servers:
+                    self.config = {"mcpServers": servers}
+                else:
+                    f.seek(0)
+                    self.config = _json_loads(f.read())
+            if self.validate:
+                self._validate_config()
+                # Only validated configs are cached, so strict loads never see an unchecked one
+                _CONFIG_CACHE[cache_key] = self.config
             logger.info(f"Loaded configuration from {self.config_path}")
-        except json.JSONDecodeError as e:
+        except _JSON_ERRORS as e:
             logger.error(f"Invalid JSON in {self.config_path}: {str(e)}")
             raise ValueError(f"Invalid JSON in {self.config_path}: {str(e)}")
         except Exception as e:
@@ -70,6 +226,18 @@ class ConfigManager:
 
     def _validate_config(self):
         """Validate the configuration structure."""
+        if _validate_mcp_config is None:
+            self._check_config()
+            return
+        try:
+            _validate_mcp_config(self.config)
+        except fastjsonschema.JsonSchemaException as e:
+            raise ValueError(f"Invalid configuration: {e.message}")
+        for server_config in self.config["mcpServers"].values():
+            server_config.setdefault("transportType", "stdio")
+
+    def _check_config(self):
+        """Validate the configuration structure without fastjsonschema."""
         if "mcpServers" not in self.config:
             raise ValueError("Configuration must contain 'mcpServers' key")
         
@@ -98,8 +266,17 @@ class ConfigManager:
 class MCPClient:
     def __init__(self, config_path: Optional[str] = None):
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
+        self._pool_key: Optional[Tuple[Any, ...]] = None
         self.config_manager = ConfigManager(config_path)
+        # (tool fingerprint, config) so unchanged tool lists skip the conversion
+        self._tools_cache: Optional[Tuple[Tuple[Tuple[str, Optional[str], str], ...], Optional[types.GenerateContentConfig]]] = None
+        # Tool list object the cached config was last checked against; the same object skips the fingerprint
+        self._tools_cache_list: Optional[List[Any]] = None
+        # Tool list from the last list_tools call; None means it must be fetched again
+        self._mcp_tools: Optional[List[Any]] = None
+        # tool name -> (inputSchema, description, declaration), converted on first use
+        self._decl_cache: Dict[str, Tuple[Any, Optional[str], Dict[str, Any]]] = {}
+        self._prewarm_task: Optional[asyncio.Task] = None
         try:
             self.genai_client = genai.Client()
             logger.info("Google GenAI Client initialized successfully")
@@ -137,87 +314,180 @@ class MCPClient:
             server_params = StdioServerParameters(command=command, args=[server_script_path], env=None)
 
         try:
-            stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-            self.stdio, self.input = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.input))
-            await self.session.initialize()
+            self.session = await self._acquire_pooled_session(server_params)
             response = await self.session.list_tools()
-            tools = response.tools
+            tools = self._mcp_tools = response.tools
             logger.info(f"Connected to server with tools: {[tool.name for tool in tools]}")
             print("\nConnected to server with tools:", [tool.name for tool in tools])
+            # Build the tool config and open the Gemini connection now, so the first query pays for neither
+            self._get_genai_tool_config(tools)
+            self._prewarm_task = asyncio.create_task(self._prewarm_genai())
         except Exception as e:
             logger.error(f"Failed to connect to server: {str(e)}", exc_info=True)
             raise
 
+    async def _acquire_pooled_session(self, server_params: StdioServerParameters) -> ClientSession:
+        """Adopt a live pooled session for these server parameters, or start the server and pool it."""
+        key = _server_pool_key(server_params)
+        entry = _SERVER_POOL.get(key)
+        if entry is not None:
+            try:
+                await entry.session.send_ping()
+                logger.debug("Reusing pooled server session for %s", server_params.command)
+            except Exception as e:
+                logger.debug("Pooled server session is dead, restarting it: %s", e)
+                await _close_pooled_server(key)
+                entry = None
+        if entry is None:
+            exit_stack = AsyncExitStack()
+            try:
+                read, write = await exit_stack.enter_async_context(stdio_client(server_params))
+                entry = _PooledServer(None, exit_stack)
+                entry.session = await exit_stack.enter_async_context(
+                    ClientSession(read, write, message_handler=entry.handle_message)
+                )
+                await entry.session.initialize()
+            except BaseException:
+                await exit_stack.aclose()
+                raise
+            _SERVER_POOL[key] = entry
+        _SERVER_POOL.move_to_end(key)
+        entry.clients.append(self)
+        self._pool_key = key
+        await _evict_idle_servers()
+        return entry.session
+
+    async def _prewarm_genai(self):
+        """Send a one-token request so the TLS/HTTP connection to Gemini is pooled before the first query."""
+        try:
+            await self.genai_client.aio.models.generate_content(
+                model=DEFAULT_GEMINI_MODEL,
+                contents=[types.Content(parts=[types.Part(text="ok")], role="user")],
+                config=types.GenerateContentConfig(max_output_tokens=1)
+            )
+            logger.debug("Gemini connection pre-warmed")
+        except Exception as e:
+            logger.debug("Gemini pre-warm request failed: %s", e)
+
+    async def _handle_server_message(self, message: Any) -> None:
+        """Drop the cached tool list when the server announces that it changed."""
+        if isinstance(message, mcp_types.ServerNotification) and isinstance(message.root, mcp_types.ToolListChangedNotification):
+            logger.debug("Server tool list changed; it will be fetched again on the next query")
+            self._mcp_tools = None
+
     def _convert_mcp_tool_to_genai_function_declaration(self, mcp_tool: Any) -> Dict[str, Any]:
         """Convert an MCP tool to a GenAI function declaration."""
-        logger.debug(f"Converting MCP tool to GenAI function declaration: {mcp_tool.name}")
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            logger.debug(f"Converting MCP tool to GenAI function declaration: {mcp_tool.name}")
         parameters_schema: Dict[str, Any] = {"type": "object", "properties": {}}
-        required_params: List[str] = []
 
-        if mcp_tool.inputSchema and isinstance(mcp_tool.inputSchema, dict):
+        # Malformed schemas are rare, so attempt the lookups and only handle the failures
+        try:
+            properties = (mcp_tool.inputSchema.get("properties") or {}).items()
+            required_params: List[str] = mcp_tool.inputSchema.get("required") or []
+        except AttributeError:
+            logger.warning(f"No input schema found for tool {mcp_tool.name}")
+        else:
             genai_properties: Dict[str, Any] = {}
-            for name, schema_prop in mcp_tool.inputSchema.get("properties", {}).items():
-                if not isinstance(schema_prop, dict):
+            for name, schema_prop in properties:
+                try:
+                    prop_type_str = schema_prop.get("type", _DEFAULT_JSON_TYPE).lower()
+                except AttributeError:
                     logger.warning(f"Skipping malformed property {name} in tool {mcp_tool.name}")
                     continue
-                prop_type_str = schema_prop.get("type", "string").lower()
-                valid_types = ["string", "number", "integer", "boolean", "array", "object"]
-                if prop_type_str not in valid_types:
+                if prop_type_str not in _VALID_JSON_TYPES:
                     logger.warning(f"Invalid type {prop_type_str} for {name} in tool {mcp_tool.name}, defaulting to string")
-                    prop_type_str = "string"
+                    prop_type_str = _DEFAULT_JSON_TYPE
                 current_prop_schema: Dict[str, Any] = {"type": prop_type_str}
                 if "description" in schema_prop:
                     current_prop_schema["description"] = schema_prop["description"]
-                if "enum" in schema_prop and isinstance(schema_prop["enum"], list):
+                # A scalar enum or non-dict items would make types.Tool reject the whole config
+                if isinstance(schema_prop.get("enum"), list):
                     current_prop_schema["enum"] = schema_prop["enum"]
-                if prop_type_str == "array" and "items" in schema_prop and isinstance(schema_prop["items"], dict):
+                if prop_type_str == "array" and isinstance(schema_prop.get("items"), dict):
                     current_prop_schema["items"] = schema_prop["items"]
                 genai_properties[name] = current_prop_schema
 
             parameters_schema["properties"] = genai_properties
-            required_params = mcp_tool.inputSchema.get("required", [])
             if isinstance(required_params, list):
                 parameters_schema["required"] = required_params
-        else:
-            logger.warning(f"No input schema found for tool {mcp_tool.name}")
 
-        logger.debug(f"Generated parameters schema for {mcp_tool.name}: {parameters_schema}")
+        if debug_enabled:
+            logger.debug(f"Generated parameters schema for {mcp_tool.name}: {parameters_schema}")
         return {
             "name": mcp_tool.name,
             "description": mcp_tool.description or f"Tool {mcp_tool.name}",
             "parameters": parameters_schema,
         }
 
+    def _get_function_declaration(self, mcp_tool: Any) -> Dict[str, Any]:
+        """Return the memoized GenAI declaration for a tool, converting it only if new or changed."""
+        cached = self._decl_cache.get(mcp_tool.name)
+        if cached:
+            schema, description, declaration = cached
+            if description == mcp_tool.description and (schema is mcp_tool.inputSchema or schema == mcp_tool.inputSchema):
+                return declaration
+        declaration = self._convert_mcp_tool_to_genai_function_declaration(mcp_tool)
+        self._decl_cache[mcp_tool.name] = (mcp_tool.inputSchema, mcp_tool.description, declaration)
+        return declaration
+
+    def _get_genai_tool_config(self, mcp_tools: List[Any]) -> Optional[types.GenerateContentConfig]:
+        """Return the GenAI config for the given tools, reusing the cached one if the tools are unchanged."""
+        # The cached tool list is reused until invalidated, so this skips hashing the schemas
+        if self._tools_cache is not None and self._tools_cache_list is mcp_tools:
+            return self._tools_cache[1]
+        fingerprint = tuple((tool.name, tool.description, _schema_digest(tool.inputSchema)) for tool in mcp_tools)
+        self._tools_cache_list = mcp_tools
+        if self._tools_cache and self._tools_cache[0] == fingerprint:
+            return self._tools_cache[1]
+
+        genai_tool_config = None
+        if mcp_tools:
+            genai_function_declarations = [self._get_function_declaration(tool) for tool in mcp_tools]
+            if genai_function_declarations:
+                genai_tools = types.Tool(function_declarations=genai_function_declarations)
+                genai_tool_config = types.GenerateContentConfig(tools=[genai_tools])
+                logger.debug("GenAI tools configured")
+        self._tools_cache = (fingerprint, genai_tool_config)
+        return genai_tool_config
+
+    async def _call_gemini_plain(self, query: str) -> str:
+        """Answer a query without tool declarations, for servers that expose no tools."""
+        logger.debug("Calling async Gemini API without tools, model %s", DEFAULT_GEMINI_MODEL)
+        try:
+            response = await self.genai_client.aio.models.generate_content(
+                model=DEFAULT_GEMINI_MODEL,
+                contents=[types.Content(parts=[types.Part(text=query)], role="user")]
+            )
+        except Exception as e:
+            logger.error(f"Error calling async Gemini API (initial call): {str(e)}", exc_info=True)
+            return f"Error calling async Gemini API (initial call): {str(e)}"
+        return "[No MCP tools available for this query]\n" + (response.text or "Gemini API response is empty or malformed.")
+
     async def process_query(self, query: str) -> str:
         """Process a user query using the connected MCP server and GenAI."""
-        logger.debug(f"Processing query: {query}")
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        logger.debug("Processing query: %s", query)
         try:
-            mcp_tools_response = await self.session.list_tools()
-            available_mcp_tools = mcp_tools_response.tools
-            logger.debug(f"Available MCP tools: {[tool.name for tool in available_mcp_tools]}")
+            if self._mcp_tools is None:
+                mcp_tools_response = await self.session.list_tools()
+                self._mcp_tools = mcp_tools_response.tools
+            available_mcp_tools = self._mcp_tools
+            if not available_mcp_tools:
+                logger.warning("No MCP tools available")
+                return await self._call_gemini_plain(query)
+            if debug_enabled:
+                logger.debug(f"Available MCP tools: {[tool.name for tool in available_mcp_tools]}")
 
             conversation_history: List[types.Content] = [
                 types.Content(parts=[types.Part(text=query)], role="user")
             ]
             final_text_parts = []
-            genai_tool_config = None
-
-            if available_mcp_tools:
-                genai_function_declarations = [
-                    self._convert_mcp_tool_to_genai_function_declaration(tool)
-                    for tool in available_mcp_tools
-                ]
-                if genai_function_declarations:
-                    genai_tools = types.Tool(function_declarations=genai_function_declarations)
-                    genai_tool_config = types.GenerateContentConfig(tools=[genai_tools])
-                    logger.debug("GenAI tools configured")
-            else:
-                final_text_parts.append("[No MCP tools available for this query]")
-                logger.warning("No MCP tools available")
+            genai_tool_config = self._get_genai_tool_config(available_mcp_tools)
 
             # Initial GenAI API call
-            logger.debug(f"Calling async Gemini API with model {DEFAULT_GEMINI_MODEL}")
+            logger.debug("Calling async Gemini API with model %s", DEFAULT_GEMINI_MODEL)
             try:
                 response = await self.genai_client.aio.models.generate_content(
                     model=DEFAULT_GEMINI_MODEL,
@@ -225,7 +495,7 @@ class MCPClient:
                     config=genai_tool_config
                 )
                 logger.debug("Gemini API call successful")
-                logger.debug(f"Response structure: {response.__dict__}")
+                logger.debug("Response structure: %s", response.__dict__)
             except Exception as e:
                 logger.error(f"Error calling async Gemini API (initial call): {str(e)}", exc_info=True)
                 return f"Error calling async Gemini API (initial call): {str(e)}"
@@ -235,7 +505,8 @@ class MCPClient:
                 logger.warning("Gemini API returned no candidates")
                 return "Gemini API returned no candidates."
 
-            logger.debug(f"Candidates: {[c.__dict__ for c in response.candidates]}")
+            if debug_enabled:
+                logger.debug(f"Candidates: {[c.__dict__ for c in response.candidates]}")
             if not response.candidates[0].content or not response.candidates[0].content.parts:
                 if response.text:
                     final_text_parts.append(response.text)
@@ -245,42 +516,52 @@ class MCPClient:
                 return "Gemini API response is empty or malformed."
 
             llm_part = response.candidates[0].content.parts[0]
-            logger.debug(f"LLM part: {llm_part.__dict__}")
+            logger.debug("LLM part: %s", llm_part.__dict__)
+            function_calls = [part.function_call for part in response.candidates[0].content.parts if part.function_call]
 
-            if llm_part.function_call:
-                logger.debug(f"LLM requested function call: {llm_part.function_call.name}")
+            if function_calls:
+                if debug_enabled:
+                    logger.debug(f"LLM requested function calls: {[fc.name for fc in function_calls]}")
                 conversation_history.append(response.candidates[0].content)
 
-                function_call = llm_part.function_call
-                tool_name = function_call.name
-                tool_args_dict = dict(function_call.args)
-                logger.debug(f"Function call args: {tool_args_dict}")
+                calls = [(function_call.name, dict(function_call.args)) for function_call in function_calls]
+                for tool_name, tool_args_dict in calls:
+                    logger.debug("Function call args for %s: %s", tool_name, tool_args_dict)
+                    final_text_parts.append(f"[LLM wants to call tool '{tool_name}' with args: {tool_args_dict}]")
 
-                final_text_parts.append(f"[LLM wants to call tool '{tool_name}' with args: {tool_args_dict}]")
+                # The calls are independent, so run them concurrently and answer them in one follow-up
+                results = await asyncio.gather(
+                    *(self.session.call_tool(tool_name, tool_args_dict) for tool_name, tool_args_dict in calls),
+                    return_exceptions=True
+                )
 
-                tool_result_content_for_llm: Dict[str, Any]
-                try:
-                    mcp_tool_result = await self.session.call_tool(tool_name, tool_args_dict)
-                    tool_result_payload = mcp_tool_result.content
-                    final_text_parts.append(f"[Tool '{tool_name}' executed. Result: {tool_result_payload}]")
-                    logger.debug(f"Tool result payload: {tool_result_payload}")
-                    if isinstance(tool_result_payload, str):
-                        tool_result_content_for_llm = {"output": tool_result_payload}
-                    elif isinstance(tool_result_payload, dict):
-                        tool_result_content_for_llm = tool_result_payload
+                tool_response_parts = []
+                for (tool_name, _), mcp_tool_result in zip(calls, results):
+                    tool_result_content_for_llm: Dict[str, Any]
+                    if isinstance(mcp_tool_result, BaseException):
+                        error_message = f"Error calling MCP tool '{tool_name}': {str(mcp_tool_result)}"
+                        logger.error(error_message, exc_info=mcp_tool_result)
+                        final_text_parts.append(f"[{error_message}]")
+                        tool_result_content_for_llm = {"error": error_message}
+                        # The tool list may be stale; fetch and rebuild it on the next query
+                        self._mcp_tools = None
+                        self._tools_cache = None
                     else:
-                        tool_result_content_for_llm = {"output": str(tool_result_payload)}
-                except Exception as e:
-                    error_message = f"Error calling MCP tool '{tool_name}': {str(e)}"
-                    logger.error(error_message, exc_info=True)
-                    final_text_parts.append(f"[{error_message}]")
-                    tool_result_content_for_llm = {"error": error_message}
-
-                tool_response_part = types.Part.from_function_response(
-                    name=tool_name,
-                    response=tool_result_content_for_llm
-                )
-                conversation_history.append(types.Content(parts=[tool_response_part], role="user"))
+                        tool_result_payload = mcp_tool_result.content
+                        final_text_parts.append(f"[Tool '{tool_name}' executed. Result: {tool_result_payload}]")
+                        logger.debug("Tool result payload: %s", tool_result_payload)
+                        if isinstance(tool_result_payload, str):
+                            tool_result_content_for_llm = {"output": tool_result_payload}
+                        elif isinstance(tool_result_payload, dict):
+                            tool_result_content_for_llm = tool_result_payload
+                        else:
+                            tool_result_content_for_llm = {"output": str(tool_result_payload)}
+
+                    tool_response_parts.append(types.Part.from_function_response(
+                        name=tool_name,
+                        response=tool_result_content_for_llm
+                    ))
+                conversation_history.append(types.Content(parts=tool_response_parts, role="user"))
 
                 # Follow-up GenAI API call
                 logger.debug("Making follow-up async Gemini API call")
@@ -290,7 +571,7 @@ class MCPClient:
                         contents=conversation_history,
                         config=genai_tool_config
                     )
-                    logger.debug(f"Follow-up response: {follow_up_response.__dict__}")
+                    logger.debug("Follow-up response: %s", follow_up_response.__dict__)
                     if follow_up_response.text:
                         final_text_parts.append(follow_up_response.text)
                     elif follow_up_response.candidates and follow_up_response.candidates[0].content.parts[0].text:
@@ -326,8 +607,14 @@ class MCPClient:
 
         while True:
             try:
-                query = input("\nQuery: ").strip()
-                logger.debug(f"Received user query: {query}")
+                print("\nQuery: ", end="", flush=True)
+                # Read stdin off the event loop so MCP stdio traffic keeps flowing while we wait
+                line = await asyncio.to_thread(sys.stdin.readline)
+                if not line:
+                    logger.info("End of input reached")
+                    break
+                query = line.strip()
+                logger.debug("Received user query: %s", query)
                 if query.lower() == 'quit':
                     logger.info("User requested to quit")
                     break
@@ -347,20 +634,32 @@ class MCPClient:
     async def cleanup(self):
         """Clean up resources used by the MCP client."""
         logger.debug("Cleaning up MCP Client")
+        if self._prewarm_task and not self._prewarm_task.done():
+            self._prewarm_task.cancel()
         try:
-            if self.exit_stack:
-                await self.exit_stack.aclose()
+            entry = _SERVER_POOL.get(self._pool_key)
+            if entry is not None and self in entry.clients:
+                # The server stays pooled for the next client; only surplus idle sessions are closed
+                entry.clients.remove(self)
+                await _evict_idle_servers()
+            self._pool_key = None
         except Exception as e:
             logger.error(f"Error during cleanup: {str(e)}", exc_info=True)
         logger.info("MCP Client cleaned up.")
         print("MCP Client cleaned up.")
 
 async def main():
+    import argparse
+
     logger.info("Starting main function")
     parser = argparse.ArgumentParser(description="MCP Client for connecting to MCP servers")
     parser.add_argument("--server", help="Name of the configured server (e.g., 'weather')")
     parser.add_argument("--script", help="Path to the server script (e.g., 'weather/weather.py')")
-    parser.add_argument("--config", help="Path to custom mcp.json configuration file")
+    parser.add_argument(
+        "--config",
+        help="Path to custom mcp.json configuration file "
+             "(set MCP_CONFIG_VALIDATE=loose to skip validating a trusted config, e.g. one generated by CI)"
+    )
     args = parser.parse_args()
 
     if args.server and args.script:
@@ -391,8 +690,14 @@ async def main():
         print(f"An unexpected error occurred: {e}")
     finally:
         await client.cleanup()
+        await close_server_pool()
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    # Load .env first so MCP_DEBUG and the other MCP_* settings in it take effect
+    load_dotenv()
+    configure_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -1,35 +1,308 @@
 import asyncio
 import os
 from typing import Optional, Dict, Any, List
-from contextlib import AsyncExitStack
+from contextlib import AsyncExitStack, asynccontextmanager
 import logging
+import logging.handlers
+import queue
+import atexit
 import sys
 import traceback
 import json
+import io
+import stat
+import hashlib
+import functools
+import mmap
 from pathlib import Path
 import argparse
 
 from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import types as mcp_types
+from mcp.client.stdio import stdio_client, get_default_environment
+from mcp.shared.message import SessionMessage
+import anyio
+import anyio.lowlevel
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
-# Configure logging
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib json module is used without it
+    orjson = None
+
+# Configure logging; file writes happen on a QueueListener thread so the event loop only enqueues records
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_file_handler = logging.FileHandler('client_debug.log', mode='w')
+_log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_file_handler, respect_handler_level=True)
+_log_listener.start()
+_log_listener_running = True
+_log_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_log_queue_handler.setFormatter(logging.Formatter('%(message)s')) # The file handler applies the full format
 logging.basicConfig(
     level=logging.DEBUG,
     format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout),
-        logging.FileHandler('client_debug.log', mode='w')
+        _log_queue_handler
     ]
 )
 logger = logging.getLogger(__name__)
 
+def _stop_log_listener():
+    """Flush queued records to client_debug.log and stop the listener thread."""
+    global _log_listener_running
+    if _log_listener_running:
+        _log_listener_running = False
+        _log_listener.stop()
+
+# Registered after logging's own shutdown hook, so it runs first and the file handler is still open
+atexit.register(_stop_log_listener)
+
 load_dotenv()
 
 DEFAULT_GEMINI_MODEL = "gemini-1.5-flash-latest"
 
+def _json_default(obj: Any) -> Any:
+    """Serialize pydantic models (e.g. MCP TextContent) as their JSON dump and anything else as str()."""
+    model_dump = getattr(obj, "model_dump", None)
+    if callable(model_dump):
+        return model_dump(mode="json")
+    return str(obj)
+
+def _dumps_sorted(obj: Any) -> bytes:
+    """Canonical (sorted-key) JSON bytes for cache keys and signatures."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # e.g. integers orjson can't represent
+            pass
+    return json.dumps(obj, sort_keys=True, default=_json_default).encode()
+
+def _to_json_compatible(obj: Any) -> Any:
+    """Round-trip obj through JSON so it only holds dicts, lists, strings, numbers, booleans and None."""
+    if orjson is not None:
+        try:
+            return orjson.loads(orjson.dumps(obj, default=_json_default))
+        except TypeError:  # same fallback as _dumps_sorted
+            pass
+    return json.loads(json.dumps(obj, default=_json_default))
+
+_VALID_JSON_TYPES = frozenset(("string", "number", "integer", "boolean", "array", "object"))
+_STRING = sys.intern("string")
+
+@functools.lru_cache(maxsize=512)
+def _compile_schema(tool_name: str, input_schema_json: bytes) -> Dict[str, Any]:
+    """Translate a tool's JSON input schema (as sorted-key JSON) into GenAI parameters.
+
+    Cached, so the result is shared between calls and must not be mutated.
+    """
+    input_schema = json.loads(input_schema_json)
+    parameters_schema: Dict[str, Any] = {"type": "object", "properties": {}}
+    genai_properties: Dict[str, Any] = {}
+    for name, schema_prop in input_schema.get("properties", {}).items():
+        if not isinstance(schema_prop, dict):
+            logger.warning(f"Skipping malformed property {name} in tool {tool_name}")
+            continue
+        raw_type = schema_prop.get("type", _STRING)
+        # Non-string types (e.g. ["string", "null"]) used to raise on .lower() and drop the whole tool
+        prop_type_str = raw_type if isinstance(raw_type, str) else None
+        if prop_type_str not in _VALID_JSON_TYPES: # Skips .lower() for the usual lower-case type
+            prop_type_str = prop_type_str and prop_type_str.lower()
+            if prop_type_str not in _VALID_JSON_TYPES:
+                logger.warning(f"Invalid type {raw_type} for {name} in tool {tool_name}, defaulting to string")
+                prop_type_str = _STRING
+        current_prop_schema: Dict[str, Any] = {"type": prop_type_str}
+        if "description" in schema_prop:
+            current_prop_schema["description"] = schema_prop["description"]
+        if "enum" in schema_prop and isinstance(schema_prop["enum"], list):
+            current_prop_schema["enum"] = schema_prop["enum"]
+        if prop_type_str == "array":
+            if "items" in schema_prop and isinstance(schema_prop["items"], dict):
+                current_prop_schema["items"] = schema_prop["items"]
+            else: # Default items for array if not specified or invalid
+                current_prop_schema["items"] = {"type": "string"}
+                logger.debug(f"Array property '{name}' in tool '{tool_name}' missing or has invalid 'items'. Defaulting to string items.")
+        genai_properties[name] = current_prop_schema
+
+    parameters_schema["properties"] = genai_properties
+    required_params_list = input_schema.get("required", [])
+    if isinstance(required_params_list, list) and all(isinstance(p, str) for p in required_params_list):
+        if required_params_list:
+            parameters_schema["required"] = required_params_list
+    return parameters_schema
+
+# Config file found per working directory. Only hits are kept, so a config created later is still
+# picked up; call reset_config_discovery() after moving or removing one.
+_DISCOVERED_CONFIGS: Dict[str, str] = {}
+
+def reset_config_discovery():
+    """Forget discovered config paths so the next ConfigManager searches again."""
+    _DISCOVERED_CONFIGS.clear()
+
+def _resolve_config_path(cwd: str) -> str:
+    """Find the first existing mcp.json for this working directory; "" if there is none."""
+    cached = _DISCOVERED_CONFIGS.get(cwd)
+    if cached is not None:
+        return cached
+    home = os.path.expanduser("~")
+    possible_paths = (
+        os.path.join(cwd, ".mcp.json"),
+        os.path.join(cwd, "mcp.json"),
+        os.path.join(home, ".config", "mcp", "mcp.json"),
+        os.path.join(home, ".mcp", "mcp.json"),
+    )
+    for path in possible_paths:
+        try:
+            os.stat(path)
+        except OSError:
+            continue
+        logger.debug(f"Found configuration file at {path}")
+        _DISCOVERED_CONFIGS[cwd] = path
+        return path
+    logger.warning("No mcp.json or .mcp.json found. Using default configuration.")
+    return ""
+
+# Configs larger than this are parsed straight from an mmap instead of a bytes copy (needs orjson)
+_MMAP_CONFIG_THRESHOLD = 64 * 1024
+
+def _load_json_file(path: str, size: int) -> Any:
+    """Parse a JSON file in one pass; orjson.JSONDecodeError subclasses json.JSONDecodeError."""
+    with open(path, 'rb') as f:
+        if orjson is None:
+            return json.loads(f.read())
+        if size > _MMAP_CONFIG_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
+        return orjson.loads(f.read())
+
+# Absolute path -> (mtime_ns, size, parsed and validated config), shared by every ConfigManager;
+# an entry is only reused while the file's mtime and size are unchanged
+_CONFIG_CACHE: Dict[str, tuple] = {}
+
+@asynccontextmanager
+async def _framed_stdio_client(server: StdioServerParameters, errlog=sys.stderr):
+    """stdio_client with linear-time framing of large messages.
+
+    mcp's stdio_client re-joins and re-splits its whole pending text buffer on every
+    chunk, which is quadratic in the size of a multi-megabyte tool result. This reads
+    raw chunks into a bytearray, only scans the new bytes for the newline delimiter and
+    hands complete frames to pydantic as bytes. Windows keeps using stdio_client.
+    """
+    if sys.platform == "win32":
+        async with stdio_client(server, errlog) as streams:
+            yield streams
+        return
+
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+    process = await anyio.open_process(
+        [server.command, *server.args],
+        env={**get_default_environment(), **server.env} if server.env is not None else get_default_environment(),
+        stderr=errlog,
+        cwd=server.cwd,
+    )
+    is_utf8 = server.encoding.lower().replace("-", "") == "utf8"
+
+    async def stdout_reader():
+        buf = bytearray()
+        scan_from = 0
+        try:
+            async with read_stream_writer:
+                async for chunk in process.stdout:
+                    buf += chunk
+                    start = 0
+                    while (end := buf.find(b"\n", scan_from)) != -1:
+                        frame = bytes(buf[start:end])
+                        start = scan_from = end + 1
+                        try:
+                            if not is_utf8:
+                                frame = frame.decode(server.encoding, server.encoding_error_handler)
+                            message = mcp_types.JSONRPCMessage.model_validate_json(frame)
+                        except Exception as exc:
+                            await read_stream_writer.send(exc)
+                            continue
+                        await read_stream_writer.send(SessionMessage(message))
+                    if start:
+                        del buf[:start]
+                    scan_from = len(buf)
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async def stdin_writer():
+        try:
+            async with write_stream_reader:
+                async for session_message in write_stream_reader:
+                    payload = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                    await process.stdin.send((payload + "\n").encode(server.encoding, server.encoding_error_handler))
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async with anyio.create_task_group() as tg, process:
+        tg.start_soon(stdout_reader)
+        tg.start_soon(stdin_writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            process.terminate()
+
+# Content/Part factories for the turn loop. Every input is a str or a dict we built ourselves, so
+# pydantic's model_construct skips the field validation the regular constructors would repeat.
+_USER_ROLE = "user"
+_MODEL_ROLE = "model"
+
+def _text_part(text: str) -> types.Part:
+    return types.Part.model_construct(text=text)
+
+def _function_response_part(name: str, response: Dict[str, Any]) -> types.Part:
+    return types.Part.model_construct(function_response=types.FunctionResponse.model_construct(name=name, response=response))
+
+def _content(parts: List[types.Part], role: str) -> types.Content:
+    return types.Content.model_construct(parts=parts, role=role)
+
+def _flush_output(out: io.StringIO):
+    """Write what a turn buffered for the console in one go and reset the buffer."""
+    text = out.getvalue()
+    if text:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        out.seek(0)
+        out.truncate(0)
+
+def _stdin_is_pipe() -> bool:
+    """True when stdin is a pipe or socket rather than a terminal or regular file."""
+    try:
+        if sys.stdin.isatty():
+            return False
+        mode = os.fstat(sys.stdin.fileno()).st_mode
+    except (AttributeError, ValueError, OSError):  # stdin replaced or closed
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+
+def _write_intermediate_text(out: io.StringIO, text_pieces: List[str]):
+    """Echo streamed model text to the console buffer if it is substantive."""
+    stripped_text = "".join(text_pieces).strip()
+    if len(stripped_text) > 10:
+        out.write(f"\n{stripped_text}\n")
+
+_INTERPRETER_BY_EXT = {".py": sys.executable, ".js": "node"}
+
+@functools.lru_cache(maxsize=32)
+def _resolve_server_script(server_script_path: str, cwd: str) -> tuple:
+    """Return (interpreter command, absolute script path); cwd is part of the cache key for relative paths."""
+    abs_script_path = os.fspath(Path(cwd, server_script_path).resolve())
+    try:
+        os.stat(abs_script_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Server script not found at {abs_script_path}") from None
+    command = _INTERPRETER_BY_EXT.get(os.path.splitext(abs_script_path)[1])
+    if command is None:
+        logger.error(f"Invalid server script extension: {abs_script_path}")
+        raise ValueError("Server script must be a .py or .js file")
+    return command, abs_script_path
+
 class ConfigManager:
     def __init__(self, config_path: Optional[str] = None):
         self.config: Dict[str, Any] = {}
@@ -37,29 +310,32 @@ class ConfigManager:
         self.load_config()
 
     def _find_config_path(self) -> str:
-        possible_paths = [
-            Path.cwd() / ".mcp.json",
-            Path.cwd() / "mcp.json",
-            Path.home() / ".config" / "mcp" / "mcp.json",
-            Path.home() / ".mcp" / "mcp.json",
-        ]
-        for path in possible_paths:
-            if path.exists():
-                logger.debug(f"Found configuration file at {path}")
-                return str(path)
-        logger.warning("No mcp.json or .mcp.json found. Using default configuration.")
-        return ""
+        return _resolve_config_path(os.getcwd())
 
     def load_config(self):
-        if not self.config_path or not Path(self.config_path).exists():
+        try:
+            st = os.stat(self.config_path) if self.config_path else None
+        except FileNotFoundError:
+            st = None
+        if st is None:
             logger.debug("No configuration file provided or found.")
             self.config = {"mcpServers": {}}
             return
 
+        cache_key = os.path.abspath(self.config_path)
+        cached = _CONFIG_CACHE.get(cache_key)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            self.config = cached[2]
+            logger.debug(f"Using cached configuration for {self.config_path}")
+            return
+        if st.st_size == 0: # Fail fast without opening the file
+            logger.error(f"Invalid JSON in {self.config_path}: file is empty")
+            raise ValueError(f"Invalid JSON in {self.config_path}: file is empty")
+
         try:
-            with open(self.config_path, 'r') as f:
-                self.config = json.load(f)
+            self.config = _load_json_file(self.config_path, st.st_size)
             self._validate_config()
+            _CONFIG_CACHE[cache_key] = (st.st_mtime_ns, st.st_size, self.config)
             logger.info(f"Loaded configuration from {self.config_path}")
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in {self.config_path}: {str(e)}")
@@ -99,6 +375,17 @@ class MCPClient:
         self.exit_stack = AsyncExitStack()
         self.config_manager = ConfigManager(config_path)
         self.genai_client: Optional[genai.Client] = None
+        # Non-blocking stdin reader, created on the first prompt (see _read_query)
+        self._stdin_reader: Optional[asyncio.StreamReader] = None
+        self._stdin_pipe_unsupported = sys.platform == "win32"
+        # Tool-set signature -> GenerateContentConfig (None when no tool converted), see _get_tool_config
+        self._tool_config_cache: Dict[str, Optional[types.GenerateContentConfig]] = {}
+        # Tool list from connect_to_server; None means it must be fetched again (see _get_tools)
+        self._cached_tools: Optional[List[Any]] = None
+        # Config built for the tool list object above, reused across queries and turns
+        self._gen_config_tools: Optional[List[Any]] = None
+        self._gen_config: Optional[types.GenerateContentConfig] = None
+        self._prewarm_task: Optional[asyncio.Task] = None
 
         api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
         if not api_key:
@@ -133,64 +420,59 @@ class MCPClient:
             )
         else:
             logger.debug(f"Attempting to connect to server with script: {server_script_path}")
-            abs_script_path = str(Path(server_script_path).resolve())
-            if not Path(abs_script_path).exists():
-                 raise FileNotFoundError(f"Server script not found at {abs_script_path}")
-            is_python = abs_script_path.endswith('.py')
-            is_js = abs_script_path.endswith('.js')
-            if not (is_python or is_js):
-                logger.error(f"Invalid server script extension: {abs_script_path}")
-                raise ValueError("Server script must be a .py or .js file")
-            command = sys.executable if is_python else "node"
+            command, abs_script_path = _resolve_server_script(server_script_path, os.getcwd())
             server_params = StdioServerParameters(command=command, args=[abs_script_path], env=None)
 
         try:
-            stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
+            stdio_transport = await self.exit_stack.enter_async_context(_framed_stdio_client(server_params))
             self.stdio, self.input = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.input))
+            self.session = await self.exit_stack.enter_async_context(
+                ClientSession(self.stdio, self.input, message_handler=self._handle_server_message)
+            )
             await self.session.initialize()
             response = await self.session.list_tools()
-            tools = response.tools
+            tools = self._cached_tools = response.tools
             logger.info(f"Connected to server with tools: {[tool.name for tool in tools]}")
             print("\nConnected to server with tools:", [tool.name for tool in tools])
         except Exception as e:
             logger.error(f"Failed to connect to server: {str(e)}", exc_info=True)
             raise
 
+    def start_prewarm(self):
+        """Pre-warm the Gemini connection in the background (cancelled by cleanup if still running)."""
+        self._prewarm_task = asyncio.create_task(self._prewarm_genai())
+
+    async def _prewarm_genai(self):
+        """Send a one-token request to pool the connection to the Gemini API; failures are only logged."""
+        try:
+            await self.genai_client.aio.models.generate_content(
+                model=DEFAULT_GEMINI_MODEL,
+                contents=[_content([_text_part("ping")], _USER_ROLE)],
+                config=types.GenerateContentConfig(max_output_tokens=1)
+            )
+            logger.debug("Gemini connection pre-warmed")
+        except Exception as e:
+            logger.debug("Gemini pre-warm request failed: %s", e)
+
+    async def _handle_server_message(self, message: Any) -> None:
+        """Drop the cached tool list when the server sends notifications/tools/list_changed."""
+        if isinstance(message, mcp_types.ServerNotification) and isinstance(message.root, mcp_types.ToolListChangedNotification):
+            logger.debug("Server tool list changed; it will be fetched again on the next query")
+            self._cached_tools = None
+
+    async def _get_tools(self) -> List[Any]:
+        """Return the server's tools, only calling list_tools when the cached list was invalidated."""
+        if self._cached_tools is None:
+            mcp_tools_response = await self.session.list_tools()
+            self._cached_tools = mcp_tools_response.tools
+        return self._cached_tools
+
     def _convert_mcp_tool_to_genai_function_declaration(self, mcp_tool: Any) -> Dict[str, Any]:
         logger.debug(f"Converting MCP tool to GenAI function declaration: {mcp_tool.name}")
-        parameters_schema: Dict[str, Any] = {"type": "object", "properties": {}}
-        
         if mcp_tool.inputSchema and isinstance(mcp_tool.inputSchema, dict):
-            genai_properties: Dict[str, Any] = {}
-            for name, schema_prop in mcp_tool.inputSchema.get("properties", {}).items():
-                if not isinstance(schema_prop, dict):
-                    logger.warning(f"Skipping malformed property {name} in tool {mcp_tool.name}")
-                    continue
-                prop_type_str = schema_prop.get("type", "string").lower()
-                valid_types = ["string", "number", "integer", "boolean", "array", "object"]
-                if prop_type_str not in valid_types:
-                    logger.warning(f"Invalid type {prop_type_str} for {name} in tool {mcp_tool.name}, defaulting to string")
-                    prop_type_str = "string"
-                current_prop_schema: Dict[str, Any] = {"type": prop_type_str}
-                if "description" in schema_prop:
-                    current_prop_schema["description"] = schema_prop["description"]
-                if "enum" in schema_prop and isinstance(schema_prop["enum"], list):
-                    current_prop_schema["enum"] = schema_prop["enum"]
-                if prop_type_str == "array":
-                    if "items" in schema_prop and isinstance(schema_prop["items"], dict):
-                        current_prop_schema["items"] = schema_prop["items"]
-                    else: # Default items for array if not specified or invalid
-                        current_prop_schema["items"] = {"type": "string"} 
-                        logger.debug(f"Array property '{name}' in tool '{mcp_tool.name}' missing or has invalid 'items'. Defaulting to string items.")
-                genai_properties[name] = current_prop_schema
-
-            parameters_schema["properties"] = genai_properties
-            required_params_list = mcp_tool.inputSchema.get("required", [])
-            if isinstance(required_params_list, list) and all(isinstance(p, str) for p in required_params_list):
-                if required_params_list:
-                    parameters_schema["required"] = required_params_list
+            parameters_schema = _compile_schema(mcp_tool.name, _dumps_sorted(mcp_tool.inputSchema))
         else:
+            parameters_schema = {"type": "object", "properties": {}}
             logger.warning(f"No input schema or malformed schema for tool {mcp_tool.name}. Tool will have no parameters.")
 
         description = mcp_tool.description
@@ -204,6 +486,81 @@ class MCPClient:
             "parameters": parameters_schema,
         }
 
+    @staticmethod
+    def _tool_set_signature(mcp_tools: List[Any]) -> str:
+        """Hash the name, description and input schema of every tool, in order."""
+        digest = hashlib.blake2b(digest_size=16)
+        for tool in mcp_tools:
+            digest.update(f"{getattr(tool, 'name', None)}\x00{getattr(tool, 'description', None)}\x00".encode())
+            digest.update(_dumps_sorted(getattr(tool, 'inputSchema', None)))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def _get_tool_config(self, available_mcp_tools: List[Any]) -> Optional[types.GenerateContentConfig]:
+        """Return the GenerateContentConfig for these tools, converting them only when the tool set changed."""
+        # The cached tool list object is reused until invalidated, so this skips even the signature
+        if self._gen_config_tools is available_mcp_tools:
+            return self._gen_config
+        signature = self._tool_set_signature(available_mcp_tools)
+        if signature in self._tool_config_cache:
+            logger.debug(f"Reusing GenAI tool config for tool set {signature}")
+            current_tool_config = self._tool_config_cache[signature]
+        else:
+            current_tool_config = self._build_tool_config(available_mcp_tools)
+            self._tool_config_cache[signature] = current_tool_config
+        self._gen_config_tools, self._gen_config = available_mcp_tools, current_tool_config
+        return current_tool_config
+
+    def _safe_convert(self, tool: Any) -> Optional[Dict[str, Any]]:
+        """Convert one MCP tool, logging and returning None when it can't be declared."""
+        if not getattr(tool, 'name', None):
+            logger.warning(f"Skipping an invalid/unnamed MCP tool: {tool}")
+            return None
+        try:
+            return self._convert_mcp_tool_to_genai_function_declaration(tool)
+        except Exception as e:
+            logger.error(f"Failed to convert MCP tool '{tool.name}' to GenAI declaration: {e}", exc_info=True)
+            return None
+
+    def _build_tool_config(self, available_mcp_tools: List[Any]) -> Optional[types.GenerateContentConfig]:
+        genai_tool_declarations_for_api = [
+            decl for decl in map(self._safe_convert, available_mcp_tools) if decl is not None
+        ]
+        current_tool_config: Optional[types.GenerateContentConfig] = None
+        if genai_tool_declarations_for_api:
+            gemini_tools = [types.Tool(function_declarations=genai_tool_declarations_for_api)]
+            current_tool_config = types.GenerateContentConfig(tools=gemini_tools)
+            logger.debug(f"GenAI tools configured for API call: {[fd['name'] for fd in genai_tool_declarations_for_api]}")
+        else:
+            logger.info("No MCP tools available or converted for this query.")
+        return current_tool_config
+
+    def _tool_result_for_llm(self, tool_name: str, mcp_tool_result: Any, out: io.StringIO) -> Dict[str, Any]:
+        """Turn a call_tool result (or the exception it raised) into a function response payload.
+
+        Console notes go to out, which process_query flushes once per turn.
+        """
+        if isinstance(mcp_tool_result, BaseException):
+            # The tool may have been removed or renamed; refetch the tool list on the next query
+            self._cached_tools = None
+            error_message = f"Error calling MCP tool '{tool_name}': {str(mcp_tool_result)}"
+            logger.error(error_message, exc_info=mcp_tool_result)
+            out.write(f"[{error_message}]\n")
+            # The traceback only goes to the log; the model gets the error message alone
+            return {"error": error_message}
+
+        tool_result_payload = mcp_tool_result.content
+        result_snippet = str(tool_result_payload)
+        if len(result_snippet) > 200: result_snippet = result_snippet[:200] + "..."
+        out.write(f"[Tool '{tool_name}' executed by MCP. Result snippet: {result_snippet}]\n")
+        logger.debug("Full tool result payload for '%s': %s", tool_name, tool_result_payload)
+
+        # One (orjson) round trip turns content models and anything else into plain JSON values
+        tool_result_json = _to_json_compatible(tool_result_payload)
+        if isinstance(tool_result_json, dict):
+            return tool_result_json
+        return {"output": tool_result_json}
+
     async def process_query(self, query: str) -> str:
         if not self.genai_client:
             logger.error("GenAI client not initialized.")
@@ -212,154 +569,162 @@ class MCPClient:
             logger.error("MCP session not initialized.")
             return "Error: MCP session not active."
             
-        logger.debug(f"Processing query: {query}")
-        final_response_text_parts = []
+        logger.debug("Processing query: %s", query)
+        final_response_buf = io.StringIO()
+        has_text = False # Whether anything but whitespace has been written to final_response_buf
+        out = io.StringIO() # Console output, written to stdout once per turn instead of print() per line
 
         try:
-            mcp_tools_response = await self.session.list_tools()
-            available_mcp_tools = mcp_tools_response.tools
-            logger.debug(f"Available MCP tools: {[tool.name for tool in available_mcp_tools]}")
+            available_mcp_tools = await self._get_tools()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Available MCP tools: {[tool.name for tool in available_mcp_tools]}")
 
-            genai_tool_declarations_for_api = []
-            if available_mcp_tools:
-                for tool in available_mcp_tools:
-                    if hasattr(tool, 'name') and tool.name:
-                        try:
-                            decl = self._convert_mcp_tool_to_genai_function_declaration(tool)
-                            genai_tool_declarations_for_api.append(decl)
-                        except Exception as e:
-                            logger.error(f"Failed to convert MCP tool '{getattr(tool, 'name', 'UNKNOWN')}' to GenAI declaration: {e}", exc_info=True)
-                    else:
-                        logger.warning(f"Skipping an invalid/unnamed MCP tool: {tool}")
-            
-            current_tool_config: Optional[types.GenerateContentConfig] = None
-            if genai_tool_declarations_for_api:
-                gemini_tools = [types.Tool(function_declarations=genai_tool_declarations_for_api)]
-                current_tool_config = types.GenerateContentConfig(tools=gemini_tools)
-                logger.debug(f"GenAI tools configured for API call: {[fd['name'] for fd in genai_tool_declarations_for_api]}")
-            else:
-                logger.info("No MCP tools available or converted for this query.")
+            current_tool_config = self._get_tool_config(available_mcp_tools)
 
             conversation_history: List[types.Content] = [
-                types.Content(parts=[types.Part(text=query)], role="user")
+                _content([_text_part(query)], _USER_ROLE)
             ]
             
             max_turns = 5 
 
             for turn_count in range(max_turns):
+                _flush_output(out) # Previous turn's output
                 logger.info(f"Conversation turn {turn_count + 1}/{max_turns}")
-                logger.debug(f"Sending to Gemini. History length: {len(conversation_history)}")
-
+                logger.debug("Sending to Gemini. History length: %d", len(conversation_history))
+
+                # Stream the reply and start each requested tool as soon as its function_call arrives,
+                # so tool execution overlaps with reading the rest of the model's output
+                model_parts: List[types.Part] = []
+                pending_text: List[str] = [] # Text since the last function_call, merged into one part
+                turn_text: List[str] = []
+                tool_tasks: List[tuple] = [] # (tool name, call_tool task)
+                got_candidate = False
+                write_text = final_response_buf.write
+                debug_on = logger.isEnabledFor(logging.DEBUG)
                 try:
-                    # THIS IS THE CORRECTED LINE from the previous error
-                    response = await self.genai_client.aio.models.generate_content(
+                    stream = await self.genai_client.aio.models.generate_content_stream(
                         model=DEFAULT_GEMINI_MODEL,
                         contents=conversation_history,
                         config=current_tool_config
                     )
-                    logger.debug(f"Gemini API call successful. Response: {response}")
+                    async for chunk in stream:
+                        if debug_on:
+                            logger.debug("Gemini stream chunk: %s", chunk)
+                        if not chunk.candidates or not chunk.candidates[0].content:
+                            continue
+                        got_candidate = True
+                        for part in chunk.candidates[0].content.parts or ():
+                            text = part.text
+                            function_call = part.function_call
+                            if text:
+                                if debug_on:
+                                    logger.debug("LLM text part: '%s'", text)
+                                write_text(text)
+                                pending_text.append(text)
+                                turn_text.append(text)
+
+                            if function_call:
+                                tool_name = function_call.name
+                                tool_args_dict = dict(function_call.args) if function_call.args else {}
+
+                                logger.info("LLM requested function call: %s with args: %s", tool_name, tool_args_dict)
+                                if pending_text:
+                                    # Text the model wrote before this call is shown before it, as it arrived
+                                    _write_intermediate_text(out, pending_text)
+                                    model_parts.append(_text_part("".join(pending_text)))
+                                    pending_text.clear()
+                                out.write(f"[LLM wants to call tool '{tool_name}' with args: {tool_args_dict}]\n")
+                                tool_tasks.append((tool_name, asyncio.create_task(self.session.call_tool(tool_name, tool_args_dict))))
+                                model_parts.append(part)
+                    logger.debug("Gemini API stream finished.")
 
                 except Exception as e:
                     logger.error(f"Error calling Gemini API (turn {turn_count + 1}): {str(e)}", exc_info=True)
-                    final_response_text_parts.append(f"\n[Error communicating with AI model: {str(e)}]")
+                    for _, task in tool_tasks:
+                        task.cancel()
+                    final_response_buf.write(f"\n[Error communicating with AI model: {str(e)}]")
                     break
 
-                if not response.candidates:
+                if not got_candidate:
                     logger.warning("Gemini API returned no candidates.")
-                    if hasattr(response, 'text') and response.text: # Fallback for older API behavior
-                         final_response_text_parts.append(response.text)
-                    else:
-                        final_response_text_parts.append("\n[AI model returned no response candidates.]")
+                    final_response_buf.write("\n[AI model returned no response candidates.]")
                     break
 
-                # Process the first candidate's content
-                model_response_content = response.candidates[0].content
-                
-                # Add model's response (which might contain a function call) to history
-                conversation_history.append(model_response_content)
-                logger.debug(f"Model response content parts: {model_response_content.parts}")
+                if pending_text:
+                    _write_intermediate_text(out, pending_text)
+                    model_parts.append(_text_part("".join(pending_text)))
+                if "".join(turn_text).strip():
+                    has_text = True
 
-                has_function_call_in_this_model_response = False
-                
-                for part in model_response_content.parts:
-                    if part.text:
-                        logger.debug(f"LLM text part: '{part.text}'")
-                        final_response_text_parts.append(part.text)
-                        if len(part.text.strip()) > 10: # Print substantive intermediate text
-                             print(f"\n{part.text.strip()}")
-
-                    if part.function_call:
-                        has_function_call_in_this_model_response = True
-                        function_call = part.function_call
-                        tool_name = function_call.name
-                        tool_args_dict = dict(function_call.args) if function_call.args else {}
-                        
-                        fc_log_msg = f"LLM requested function call: {tool_name} with args: {tool_args_dict}"
-                        logger.info(fc_log_msg)
-                        print(f"[LLM wants to call tool '{tool_name}' with args: {tool_args_dict}]")
-
-                        tool_result_content_for_llm: Dict[str, Any]
-                        try:
-                            mcp_tool_result = await self.session.call_tool(tool_name, tool_args_dict)
-                            tool_result_payload = mcp_tool_result.content
-                            
-                            result_snippet = str(tool_result_payload)
-                            if len(result_snippet) > 200: result_snippet = result_snippet[:200] + "..."
-                            print(f"[Tool '{tool_name}' executed by MCP. Result snippet: {result_snippet}]")
-                            logger.debug(f"Full tool result payload for '{tool_name}': {tool_result_payload}")
-                            
-                            if isinstance(tool_result_payload, dict):
-                                tool_result_content_for_llm = tool_result_payload
-                            elif isinstance(tool_result_payload, (str, int, float, bool, list)):
-                                tool_result_content_for_llm = {"output": tool_result_payload}
-                            else:
-                                tool_result_content_for_llm = {"output": str(tool_result_payload)}
-
-                        except Exception as e:
-                            error_message = f"Error calling MCP tool '{tool_name}': {str(e)}"
-                            logger.error(error_message, exc_info=True)
-                            print(f"[{error_message}]")
-                            tool_result_content_for_llm = {"error": error_message, "details": traceback.format_exc()}
-                        
-                        # As per your first script's logic (and common patterns for multi-turn with this client style):
-                        # The model's function_call part is already in history.
-                        # Now add the function_response part.
-                        # The genai.Client docs (function calling section, MCP example) shows adding the
-                        # function response part with role="user". Let's adhere to that.
-                        tool_response_part_for_history = types.Part.from_function_response(
-                            name=tool_name,
-                            response=tool_result_content_for_llm
-                        )
-                        conversation_history.append(types.Content(parts=[tool_response_part_for_history], role="user"))
-                        logger.debug(f"Tool response for '{tool_name}' added to history with role 'user': {tool_result_content_for_llm}")
-                        break # Process one function call per LLM response cycle
+                # Add model's response (which might contain function calls) to history
+                model_response_content = _content(model_parts, _MODEL_ROLE)
+                conversation_history.append(model_response_content)
+                logger.debug("Model response content parts: %s", model_parts)
+                has_function_call_in_this_model_response = bool(tool_tasks)
+
+                if tool_tasks:
+                    # Every call the model asked for is already running; answer them all in the next turn
+                    results = await asyncio.gather(*(task for _, task in tool_tasks), return_exceptions=True)
+                    # The model's function_call parts are already in history; the genai.Client docs
+                    # (function calling section, MCP example) add the function responses with role="user".
+                    tool_response_parts_for_history = [
+                        _function_response_part(tool_name, self._tool_result_for_llm(tool_name, mcp_tool_result, out))
+                        for (tool_name, _), mcp_tool_result in zip(tool_tasks, results)
+                    ]
+                    conversation_history.append(_content(tool_response_parts_for_history, _USER_ROLE))
+                    logger.debug(f"{len(tool_response_parts_for_history)} tool response(s) added to history with role 'user'")
 
                 if not has_function_call_in_this_model_response:
                     logger.info("No function call in this model response. Assuming final textual response.")
-                    # If no text parts were directly added from model_response_content.parts,
-                    # but response.text (top-level) has content, use it.
-                    # This was the pattern in your original script.
-                    if not any(p.strip() for p in final_response_text_parts) and hasattr(response, 'text') and response.text:
-                        logger.debug(f"No text parts collected from model_response_content, using response.text: {response.text}")
-                        final_response_text_parts.append(response.text)
-                    
-                    if not any(p.strip() for p in final_response_text_parts): # If still nothing
+                    if not has_text: # If still nothing
                         logger.warning("LLM provided no text and no function call. Ending turn.")
-                        final_response_text_parts.append("[AI model provided no further text or actions.]")
+                        final_response_buf.write("[AI model provided no further text or actions.]")
                     break # Exit the loop
 
             else: # max_turns reached
                 logger.warning(f"Max interaction turns ({max_turns}) reached.")
-                if not any(p.strip() for p in final_response_text_parts): # If loop finished and no text gathered
-                    final_response_text_parts.append("\n[Max interaction turns reached with AI model. No final text generated.]")
+                if not has_text: # If loop finished and no text gathered
+                    final_response_buf.write("\n[Max interaction turns reached with AI model. No final text generated.]")
                 else:
-                    final_response_text_parts.append("\n[Max interaction turns reached with AI model.]")
+                    final_response_buf.write("\n[Max interaction turns reached with AI model.]")
 
-            return "".join(final_response_text_parts).strip()
+            return final_response_buf.getvalue().strip()
 
         except Exception as e:
             logger.error(f"Critical error in process_query: {str(e)}", exc_info=True)
             return f"Error in query processing: {str(e)}"
+        finally:
+            _flush_output(out)
+
+    async def _read_query(self, prompt: str) -> Optional[str]:
+        """Prompt for and read one line from stdin on the event loop; None at EOF."""
+        if self._stdin_reader is None and not self._stdin_pipe_unsupported:
+            # Only pipes and sockets: on a TTY connect_read_pipe would leave the terminal
+            # non-blocking after exit, and regular files can't be watched by the loop
+            if not _stdin_is_pipe():
+                self._stdin_pipe_unsupported = True
+        if self._stdin_reader is None and not self._stdin_pipe_unsupported:
+            reader = asyncio.StreamReader()
+            try:
+                await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+                self._stdin_reader = reader
+            except (NotImplementedError, ValueError, OSError) as e:
+                # Windows event loops can't read pipes this way
+                logger.debug(f"Reading stdin through a worker thread instead of a pipe reader: {e}")
+                self._stdin_pipe_unsupported = True
+
+        if self._stdin_reader is None:
+            try:
+                return await asyncio.to_thread(input, prompt)
+            except EOFError:
+                return None
+
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        line = await self._stdin_reader.readline()
+        if not line:
+            return None
+        return line.decode().rstrip("\n")
 
     async def chat_loop(self):
         logger.info("Starting chat loop")
@@ -369,9 +734,12 @@ class MCPClient:
 
         while True:
             try:
-                query = await asyncio.to_thread(input, "\nQuery: ") 
+                query = await self._read_query("\nQuery: ")
+                if query is None:
+                    logger.info("End of input, leaving chat loop")
+                    break
                 query = query.strip()
-                logger.debug(f"Received user query: {query}")
+                logger.debug("Received user query: %s", query)
 
                 if query.lower() == 'quit':
                     logger.info("User requested to quit")
@@ -402,6 +770,8 @@ class MCPClient:
 
     async def cleanup(self):
         logger.debug("Cleaning up MCP Client")
+        if self._prewarm_task and not self._prewarm_task.done():
+            self._prewarm_task.cancel()
         try:
             if self.exit_stack:
                 await self.exit_stack.aclose()
@@ -440,6 +810,9 @@ async def main():
     try:
         client = MCPClient(config_path=args.config) 
         
+        # Open the Gemini HTTPS connection while the MCP server starts, so the first query skips the handshake.
+        # connect_to_server itself must stay in this task: the stdio transport's cancel scope is exited in cleanup.
+        client.start_prewarm()
         if args.server:
             await client.connect_to_server(server_name=args.server)
         elif args.script: 
@@ -461,7 +834,13 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        import uvloop # Optional: faster C event loop for the stdio and HTTPS streams
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    try:
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(main())
     except KeyboardInterrupt:
         logger.info("Program interrupted by user (Ctrl+C at top level).")
         print("\nProgram interrupted. Exiting.")
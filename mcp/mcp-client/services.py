@@ -1,50 +1,217 @@
 # import logging # No longer needed directly
-from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import collections
+import functools
+import hashlib
+import importlib.util
+import json
+import sys
+import time
+from types import MappingProxyType
+from typing import Dict, Any, AsyncIterator, Callable, Deque, List, Optional, Tuple
 from contextlib import AsyncExitStack
 
 from mcp import ClientSession, StdioServerParameters, Tool
+from mcp import types as mcp_types
 from mcp.client.stdio import stdio_client
+import httpx
 from google import genai
 from google.genai import types as genai_types
 
 # Use the new logger
-from app_logger import service_log_debug, service_log_info, service_log_warning, service_log_error
+from app_logger import service_log_debug, service_log_info, service_log_warning, service_log_error, is_debug_enabled
 
 # logger = logging.getLogger(__name__) # REMOVE
 
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib json module is used without it
+    orjson = None
+
+# httpx only speaks HTTP/2 when the optional h2 package is installed
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# Set once the missing-h2 notice has been logged, so only the first LLMService reports it
+_http2_notice_logged = False
+# Arguments for the httpx.AsyncClient the GenAI SDK creates once per genai.Client;
+# generous keep-alive so back-to-back turns reuse the same TLS connection
+_GENAI_ASYNC_CLIENT_ARGS: Dict[str, Any] = {
+    "http2": _HTTP2_AVAILABLE,
+    "limits": httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=120.0),
+}
+
+# JSON schema types GenAI accepts for tool parameters; anything else falls back to string
+_VALID_GENAI_TYPES = frozenset(("string", "number", "integer", "boolean", "array", "object"))
+_DEFAULT_PROP_TYPE = "string"
+# Read-only {"type": ...} schemas shared by every property that has nothing
+# but a type, instead of a fresh dict per property per tool
+_PRIMITIVE_PROP_SCHEMAS = {t: MappingProxyType({"type": t}) for t in _VALID_GENAI_TYPES}
+# Items schema for array properties without usable 'items'
+_DEFAULT_ARRAY_ITEMS = _PRIMITIVE_PROP_SCHEMAS[_DEFAULT_PROP_TYPE]
+
+def _dumps_sorted(obj: Any) -> bytes:
+    """Sorted-key JSON bytes of `obj`, stable enough to hash."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # e.g. integers orjson can't represent
+            pass
+    return json.dumps(obj, sort_keys=True, default=str).encode()
+
+@functools.lru_cache(maxsize=512)
+def _schema_digest(schema_json: bytes) -> bytes:
+    """Short digest of a serialized inputSchema, used to key the declaration cache."""
+    return hashlib.blake2b(schema_json, digest_size=16).digest()
+
+@functools.lru_cache(maxsize=512)
+def _effective_description(tool_name: str, description: Optional[str]) -> str:
+    """The tool's stripped description, or the interned default when it has none."""
+    if isinstance(description, str):
+        stripped = description.strip()
+        if stripped:
+            return sys.intern(stripped)
+    service_log_warning(f"Tool '{tool_name}' has missing/empty description, using default.")
+    return sys.intern(f"Tool to perform {tool_name}")
+
+# A session idle for longer than this is pinged before it is used again
+MCP_IDLE_PING_SECONDS = 60.0
+# In-flight tool calls per server unless its config sets "max_concurrent"
+DEFAULT_MAX_CONCURRENT_TOOL_CALLS = 8
+
 class MCPService:
-    def __init__(self, server_name: str, server_config: Dict[str, Any], exit_stack: AsyncExitStack):
+    """
+    One long-lived stdio session to an MCP server.
+
+    Connect once per process and share the service across all turns, either
+    through `async with MCPService(...)` or by passing in the application's
+    exit stack; never create one per request.
+    """
+    def __init__(self, server_name: str, server_config: Dict[str, Any], exit_stack: Optional[AsyncExitStack] = None):
         self.server_name = server_name
         self.server_config = server_config
-        self.exit_stack = exit_stack
+        # Without a caller-provided stack the service owns its transport and closes it itself
+        self._owns_exit_stack = exit_stack is None
+        self.exit_stack = exit_stack if exit_stack is not None else AsyncExitStack()
         self.session: Optional[ClientSession] = None
         self.stdio = None
         self.input = None
+        self.last_used = 0.0
+        # Caps in-flight calls so a large batch can't flood the server's stdio pipe
+        self._call_semaphore = asyncio.Semaphore(
+            server_config.get("max_concurrent", DEFAULT_MAX_CONCURRENT_TOOL_CALLS)
+        )
+        # Tool list from the last list_tools() RPC; dropped when the server
+        # reports a change or invalidate_tools() is called
+        self._tools_cache: Optional[List[Tool]] = None
+        # GenAI function declarations for the cached tools, filled in by the
+        # caller via LLMService.build_function_declarations; reset with the cache
+        self.genai_declarations: Optional[Tuple[Dict[str, Any], ...]] = None
+
+    async def __aenter__(self) -> "MCPService":
+        await self.ensure_connected()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def ensure_connected(self):
+        """Connects on first use; afterwards only pings a session that has been idle a while."""
+        if self.session is None:
+            await self.connect()
+            return
+        now = time.monotonic()
+        if now - self.last_used > MCP_IDLE_PING_SECONDS:
+            service_log_debug(f"MCP server {self.server_name} idle for {now - self.last_used:.0f}s, pinging.")
+            try:
+                await self.session.send_ping()
+            except Exception as e:
+                service_log_error(f"MCP server {self.server_name} did not answer ping: {e}", exc_info=True)
+                raise ConnectionError(f"Lost connection to MCP server {self.server_name}") from e
+            self.last_used = time.monotonic()
+
+    async def close(self):
+        if not self._owns_exit_stack:
+            # The transport belongs to the caller's exit stack and is closed with it
+            return
+        service_log_info(f"Closing MCP server connection: {self.server_name}")
+        await self.exit_stack.aclose()
+        self.session = None
+        self.invalidate_tools()
+        self.stdio = None
+        self.input = None
 
     async def connect(self):
+        await self.open_transport()
+        await self.initialize()
+
+    async def open_transport(self):
+        """
+        Starts the server process and the client session on the exit stack.
+
+        anyio requires these contexts to be exited by the task that entered
+        them, so call this from the task that will close the exit stack.
+        """
         service_log_info(f"Connecting to MCP server: {self.server_name}")
         params = StdioServerParameters(
             command=self.server_config["command"],
             args=self.server_config["args"],
             env=self.server_config.get("env")
         )
+        # The session is pushed after its transport, so the stack's LIFO unwind
+        # closes the session before terminating the process. Both contexts hold
+        # anyio task groups, which is why the unwind stays serial in one task.
         try:
             stdio_transport = await self.exit_stack.enter_async_context(stdio_client(params))
             self.stdio, self.input = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.input))
+            self.session = await self.exit_stack.enter_async_context(
+                ClientSession(self.stdio, self.input, message_handler=self._handle_server_message)
+            )
+        except Exception as e:
+            service_log_error(f"Failed to connect to MCP server {self.server_name}: {e}", exc_info=True)
+            raise
+
+    async def initialize(self):
+        """MCP handshake and first tool listing; safe to run concurrently for several services."""
+        try:
             await self.session.initialize()
             tools = await self.get_tools()
             service_log_info(f"Connected to {self.server_name} with tools: {[tool.name for tool in tools]}")
         except Exception as e:
+            self.session = None
             service_log_error(f"Failed to connect to MCP server {self.server_name}: {e}", exc_info=True)
             raise
 
+    async def _handle_server_message(self, message: Any) -> None:
+        if isinstance(message, mcp_types.ServerNotification) and isinstance(message.root, mcp_types.ToolListChangedNotification):
+            service_log_info(f"MCP server {self.server_name} reported a tool list change.")
+            self.invalidate_tools()
+
+    def invalidate_tools(self):
+        self._tools_cache = None
+        self.genai_declarations = None
+
     async def get_tools(self) -> List[Tool]:
+        if self._tools_cache is not None and self.session:
+            return self._tools_cache
+        return await self.refresh_tools()
+
+    async def refresh_tools(self) -> List[Tool]:
+        """Fetches the tool list from the server, bypassing and replacing the cache."""
         if not self.session:
             # This is an internal error state, should be caught before user sees it
             service_log_error(f"Attempted to get tools from unconnected MCP server {self.server_name}")
             raise ConnectionError(f"Not connected to MCP server {self.server_name}")
         response = await self.session.list_tools()
+        self.last_used = time.monotonic()
+        self._tools_cache = response.tools
+        self.genai_declarations = None
+        for tool in response.tools:
+            # Resolve descriptions while connecting rather than on the first LLM turn
+            _effective_description(tool.name, tool.description)
         service_log_debug(f"Listed tools for {self.server_name}: {[t.name for t in response.tools]}")
         return response.tools
 
@@ -52,76 +219,209 @@ class MCPService:
         if not self.session:
             service_log_error(f"Attempted to call tool on unconnected MCP server {self.server_name}")
             raise ConnectionError(f"Not connected to MCP server {self.server_name}")
-        service_log_info(f"Calling tool '{tool_name}' on server '{self.server_name}' with args: {args}")
-        # For VERBOSE, log full args. For NORMAL, maybe just tool_name.
-        service_log_debug(f"Full args for '{tool_name}': {args}")
+        service_log_debug("tool_call %s server=%s args=%r", tool_name, self.server_name, args)
         try:
-            result = await self.session.call_tool(tool_name, args)
-            service_log_debug(f"Raw tool result content for '{tool_name}': {str(result.content)[:200]}...")
+            async with self._call_semaphore:
+                result = await self.session.call_tool(tool_name, args)
+            self.last_used = time.monotonic()
+            if is_debug_enabled():
+                service_log_debug("Raw tool result content for '%s': %s...", tool_name, str(result.content)[:200])
             return result.content
         except Exception as e:
-            service_log_error(f"Error calling tool '{tool_name}' on MCP server {self.server_name}: {e}", exc_info=True)
+            # Tracebacks only at VERBOSE; the error itself is reported to the caller
+            service_log_error("Error calling tool '%s' on MCP server %s: %s", tool_name, self.server_name, e, exc_info=is_debug_enabled())
             raise
 
+    async def call_tools_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """Runs several tool calls concurrently on this server.
+
+        Results come back in the order of `calls`: the result content for a
+        successful call, or the exception it raised.
+        """
+        if not self.session:
+            service_log_error(f"Attempted to call tools on unconnected MCP server {self.server_name}")
+            raise ConnectionError(f"Not connected to MCP server {self.server_name}")
+        service_log_debug("tool_call_batch server=%s calls=%r", self.server_name, calls)
+        session = self.session
+        semaphore = self._call_semaphore
+
+        async def call_limited(tool_name: str, args: Dict[str, Any]):
+            async with semaphore:
+                return await session.call_tool(tool_name, args)
+
+        results = await asyncio.gather(
+            *(call_limited(tool_name, args) for tool_name, args in calls),
+            return_exceptions=True
+        )
+        self.last_used = time.monotonic()
+        debug_enabled = is_debug_enabled()
+        batch_results: List[Any] = []
+        for (tool_name, _), result in zip(calls, results):
+            if isinstance(result, BaseException):
+                service_log_error("Error calling tool '%s' on MCP server %s: %s", tool_name, self.server_name, result,
+                                  exc_info=result if debug_enabled else None)
+                batch_results.append(result)
+            else:
+                if debug_enabled:
+                    service_log_debug("Raw tool result content for '%s': %s...", tool_name, str(result.content)[:200])
+                batch_results.append(result.content)
+        return batch_results
+
+
+# The same tool call (name and arguments) this many times in a row is treated as a loop
+TOOL_LOOP_THRESHOLD = 3
+
+
+class ToolLoopError(RuntimeError):
+    """The LLM kept requesting the same tool call with the same arguments."""
+    def __init__(self, tool_name: str, repeats: int):
+        super().__init__(f"Tool '{tool_name}' was requested {repeats} times in a row with the same arguments")
+        self.tool_name = tool_name
+        self.repeats = repeats
+
+
+def _log_http2_notice() -> None:
+    global _http2_notice_logged
+    if _HTTP2_AVAILABLE or _http2_notice_logged:
+        return
+    _http2_notice_logged = True
+    service_log_warning("HTTP/2 is off for Gemini requests because the h2 package is not installed; "
+                        "install httpx[http2] to enable it")
 
 class LLMService:
     def __init__(self, model_name: str, api_key: str):
         self.model_name = model_name
         try:
-            self.genai_client = genai.Client(api_key=api_key)
-            service_log_info(f"Google GenAI Client initialized for model: {self.model_name}")
+            self.genai_client = genai.Client(
+                api_key=api_key,
+                http_options=genai_types.HttpOptions(async_client_args=_GENAI_ASYNC_CLIENT_ARGS)
+            )
+            service_log_info(f"Google GenAI Client initialized for model: {self.model_name} (HTTP/2: {_HTTP2_AVAILABLE})")
+            _log_http2_notice()
         except Exception as e:
             service_log_error(f"Failed to initialize Google GenAI Client: {e}", exc_info=True)
             raise
+        # Converted declarations, keyed by (name, description, schema digest).
+        # _last_decl holds the last Tool object seen per name so the same
+        # instance reused across turns is an identity check, not a re-hash.
+        # Each entry also holds the compiled inputSchema validator for that schema
+        # (None without fastjsonschema), so the two can never disagree.
+        self._decl_cache: Dict[Tuple[str, Optional[str], bytes], Tuple[Dict[str, Any], Optional[Callable[[Any], Any]]]] = {}
+        self._last_decl: Dict[str, Tuple[Tool, Dict[str, Any]]] = {}
+        # Validator of the declaration last picked per tool name, used by validate_tool_args
+        self._arg_validators: Dict[str, Callable[[Any], Any]] = {}
+        # Last (declaration ids, config, tool names for debug logs) handed out by prepare_tools_for_llm
+        self._tool_config_cache: Optional[Tuple[Tuple[int, ...], genai_types.GenerateContentConfig, Tuple[str, ...]]] = None
+        # Digests of the most recent tool calls the LLM requested, oldest first
+        self._recent_tool_calls: Deque[bytes] = collections.deque(maxlen=8)
 
     def _convert_mcp_tool_to_genai_function(self, mcp_tool: Tool) -> Dict[str, Any]:
+        cached = self._last_decl.get(mcp_tool.name)
+        if cached is not None and cached[0] is mcp_tool:
+            return cached[1]
+
+        schema_json = _dumps_sorted(mcp_tool.inputSchema)
+        key = (mcp_tool.name, mcp_tool.description, _schema_digest(schema_json))
+        cached_entry = self._decl_cache.get(key)
+        if cached_entry is None:
+            decl = self._build_genai_function(mcp_tool)
+            validator = self._compile_arg_validator(mcp_tool)
+            self._decl_cache[key] = (decl, validator)
+        else:
+            decl, validator = cached_entry
+            service_log_debug(f"Reusing cached GenAI function declaration for '{mcp_tool.name}'.")
+        if validator is not None:
+            self._arg_validators[mcp_tool.name] = validator
+        else:
+            self._arg_validators.pop(mcp_tool.name, None)
+        self._last_decl[mcp_tool.name] = (mcp_tool, decl)
+        return decl
+
+    def _build_genai_function(self, mcp_tool: Tool) -> Dict[str, Any]:
         service_log_debug(f"Converting MCP tool '{mcp_tool.name}' to GenAI function declaration.")
         parameters_schema: Dict[str, Any] = {"type": "object", "properties": {}}
-        if mcp_tool.inputSchema and isinstance(mcp_tool.inputSchema, dict):
+        tool_name = mcp_tool.name
+        input_schema = mcp_tool.inputSchema
+        if input_schema and isinstance(input_schema, dict):
             genai_properties: Dict[str, Any] = {}
-            for name, schema_prop in mcp_tool.inputSchema.get("properties", {}).items():
+            valid_types = _VALID_GENAI_TYPES
+            primitive_schemas = _PRIMITIVE_PROP_SCHEMAS
+            properties = input_schema.get("properties")
+            if not isinstance(properties, dict):
+                properties = {}
+            for name, schema_prop in properties.items():
                 if not isinstance(schema_prop, dict): 
-                    service_log_warning(f"Skipping malformed property {name} in tool {mcp_tool.name}")
+                    service_log_warning(f"Skipping malformed property {name} in tool {tool_name}")
+                    continue
+                sp_get = schema_prop.get
+                prop_type_str = sp_get("type", _DEFAULT_PROP_TYPE)
+                # Schemas almost always use the lowercase names already; only
+                # fall back to lower() (and then to string) when they don't
+                if not isinstance(prop_type_str, str) or prop_type_str not in valid_types:
+                    normalized = prop_type_str.lower() if isinstance(prop_type_str, str) else None
+                    if normalized not in valid_types:
+                        service_log_warning(f"Invalid type {prop_type_str} for {name} in tool {tool_name}, defaulting to string")
+                        normalized = _DEFAULT_PROP_TYPE
+                    prop_type_str = normalized
+
+                desc = sp_get("description")
+                if not isinstance(desc, str):
+                    desc = None
+                enum = sp_get("enum")
+                has_enum = isinstance(enum, list)
+                is_array = prop_type_str == "array"
+                if not (desc or has_enum or is_array):
+                    genai_properties[name] = primitive_schemas[prop_type_str]
                     continue
-                prop_type_str = schema_prop.get("type", "string").lower()
-                valid_types = ["string", "number", "integer", "boolean", "array", "object"]
-                if prop_type_str not in valid_types: 
-                    service_log_warning(f"Invalid type {prop_type_str} for {name} in tool {mcp_tool.name}, defaulting to string")
-                    prop_type_str = "string"
-                
+
                 current_prop_schema: Dict[str, Any] = {"type": prop_type_str}
-                if "description" in schema_prop:
-                    current_prop_schema["description"] = schema_prop["description"]
-                if "enum" in schema_prop and isinstance(schema_prop["enum"], list):
-                    current_prop_schema["enum"] = schema_prop["enum"]
-                if prop_type_str == "array":
-                    current_prop_schema["items"] = schema_prop.get("items", {"type": "string"}) 
-                    if "items" not in schema_prop or not isinstance(schema_prop.get("items"),dict) :
-                         service_log_debug(f"Array property '{name}' in tool '{mcp_tool.name}' missing or has invalid 'items'. Defaulting to string items.")
+                if desc:
+                    current_prop_schema["description"] = desc
+                if has_enum:
+                    current_prop_schema["enum"] = enum
+                if is_array:
+                    items = sp_get("items")
+                    if isinstance(items, dict):
+                        current_prop_schema["items"] = items
+                    else:
+                        current_prop_schema["items"] = _DEFAULT_ARRAY_ITEMS
+                        service_log_debug(f"Array property '{name}' in tool '{tool_name}' missing or has invalid 'items'. Defaulting to string items.")
                 genai_properties[name] = current_prop_schema
             parameters_schema["properties"] = genai_properties
-            required = mcp_tool.inputSchema.get("required", [])
+            required = input_schema.get("required", [])
             if required and isinstance(required, list) and all(isinstance(p, str) for p in required):
                 parameters_schema["required"] = required
         else:
-            service_log_warning(f"No input schema or malformed schema for tool {mcp_tool.name}. Tool will have no parameters.")
+            service_log_warning(f"No input schema or malformed schema for tool {tool_name}. Tool will have no parameters.")
 
-        description = mcp_tool.description
-        if not description or not isinstance(description, str) or not description.strip():
-            description = f"Tool to perform {mcp_tool.name}"
-            service_log_warning(f"Tool '{mcp_tool.name}' has missing/empty description, using default.")
-        
         return {
             "name": mcp_tool.name,
-            "description": description,
+            "description": _effective_description(mcp_tool.name, mcp_tool.description),
             "parameters": parameters_schema,
         }
 
-    def prepare_tools_for_llm(self, mcp_tools: List[Tool]) -> Optional[genai_types.GenerateContentConfig]:
-        if not mcp_tools:
-            service_log_debug("No MCP tools provided to prepare for LLM.")
+    def _compile_arg_validator(self, mcp_tool: Tool) -> Optional[Callable[[Any], Any]]:
+        if fastjsonschema is None or not isinstance(mcp_tool.inputSchema, dict):
             return None
-        
+        try:
+            # use_default=False: checking the arguments must not fill in defaults
+            return fastjsonschema.compile(mcp_tool.inputSchema, use_default=False)
+        except Exception as e:
+            service_log_warning(f"Could not compile input schema for tool '{mcp_tool.name}', its arguments won't be checked: {e}")
+            return None
+
+    def validate_tool_args(self, tool_name: str, args: Dict[str, Any]) -> Optional[str]:
+        """Returns why `args` don't match the tool's input schema, or None if they do (or can't be checked)."""
+        validator = self._arg_validators.get(tool_name)
+        if validator is None:
+            return None
+        try:
+            validator(args)
+        except fastjsonschema.JsonSchemaException as e:
+            return e.message
+        return None
+
+    def build_function_declarations(self, mcp_tools: List[Tool]) -> Tuple[Dict[str, Any], ...]:
         service_log_debug(f"Preparing {len(mcp_tools)} MCP tools for LLM.")
         genai_tool_declarations = []
         for tool in mcp_tools:
@@ -133,14 +433,59 @@ class LLMService:
                     service_log_error(f"Failed to convert MCP tool '{getattr(tool, 'name', 'UNKNOWN')}' for LLM: {e}", exc_info=True)
             else:
                 service_log_warning(f"Skipping an invalid/unnamed MCP tool: {tool}")
+        return tuple(genai_tool_declarations)
 
+    def prepare_tools_for_llm(self, mcp_tools: List[Tool]) -> Optional[genai_types.GenerateContentConfig]:
+        if not mcp_tools:
+            service_log_debug("No MCP tools provided to prepare for LLM.")
+            return None
+        return self.prepare_tools_from_declarations(self.build_function_declarations(mcp_tools))
+
+    def prepare_tools_from_declarations(
+        self,
+        genai_tool_declarations: Tuple[Dict[str, Any], ...]
+    ) -> Optional[genai_types.GenerateContentConfig]:
         if not genai_tool_declarations:
             service_log_info("No MCP tools were successfully converted for LLM.")
             return None
-            
-        gemini_tools = [genai_types.Tool(function_declarations=genai_tool_declarations)]
-        service_log_info(f"LLM tools configured: {[fd['name'] for fd in genai_tool_declarations]}")
-        return genai_types.GenerateContentConfig(tools=gemini_tools)
+
+        # Declarations are cached per tool, so the same tool set yields the same
+        # dict objects and their ids identify it without re-hashing any schema
+        config_key = tuple(id(decl) for decl in genai_tool_declarations)
+        if self._tool_config_cache is not None and self._tool_config_cache[0] == config_key:
+            service_log_debug("Tool set unchanged, reusing cached LLM tool config.")
+            return self._tool_config_cache[1]
+
+        gemini_tools = [genai_types.Tool(function_declarations=list(genai_tool_declarations))]
+        tool_names = tuple(fd['name'] for fd in genai_tool_declarations)
+        service_log_info(f"LLM tools configured: {list(tool_names)}")
+        config = genai_types.GenerateContentConfig(tools=gemini_tools)
+        self._tool_config_cache = (config_key, config, tool_names)
+        return config
+
+    def _tool_names_for_log(self, tool_config: genai_types.GenerateContentConfig) -> Any:
+        cached = self._tool_config_cache
+        if cached is not None and cached[1] is tool_config:
+            return cached[2]
+        return [(tool.function_declarations[0].name if tool.function_declarations else 'N/A') for tool in tool_config.tools or ()]
+
+    def reset_tool_call_history(self):
+        self._recent_tool_calls.clear()
+
+    def check_tool_call(self, tool_name: str, args: Dict[str, Any]):
+        """Records a requested tool call; raises ToolLoopError once it repeats TOOL_LOOP_THRESHOLD times in a row."""
+        signature = hashlib.blake2b(tool_name.encode() + b"\0" + _dumps_sorted(args), digest_size=16).digest()
+        recent = self._recent_tool_calls
+        recent.append(signature)
+        repeats = 0
+        for previous in reversed(recent):
+            if previous != signature:
+                break
+            repeats += 1
+        if repeats >= TOOL_LOOP_THRESHOLD:
+            service_log_warning(f"Tool '{tool_name}' requested {repeats} times in a row with the same arguments, stopping.")
+            recent.clear()
+            raise ToolLoopError(tool_name, repeats)
 
     async def generate_response(
         self,
@@ -150,9 +495,11 @@ class LLMService:
         # Normal level should log the start of an LLM call
         service_log_info(f"Sending request to LLM model: {self.model_name}. History length: {len(conversation_history)}.")
         # Verbose level can log the actual content being sent (careful with PII/size)
-        service_log_debug(f"LLM request contents (last message): {conversation_history[-1] if conversation_history else 'None'}")
-        if tool_config:
-             service_log_debug(f"LLM tool_config: {[(tool.function_declarations[0].name if tool.function_declarations else 'N/A') for tool in tool_config.tools]}")
+        debug_enabled = is_debug_enabled()
+        if debug_enabled:
+            service_log_debug("LLM request contents (last message): %s", conversation_history[-1] if conversation_history else 'None')
+            if tool_config:
+                service_log_debug("LLM tool_config: tools=%s", self._tool_names_for_log(tool_config))
 
 
         try:
@@ -162,8 +509,37 @@ class LLMService:
                 config=tool_config
             )
             service_log_info(f"LLM API call successful to model {self.model_name}.")
-            service_log_debug(f"LLM response object: {str(response)[:500]}...") # Log snippet of raw response
+            if debug_enabled:
+                service_log_debug("LLM response object: %s...", str(response)[:500]) # Log snippet of raw response
             return response
         except Exception as e:
             service_log_error(f"Error calling Gemini API ({self.model_name}): {e}", exc_info=True)
             raise
+
+    async def generate_response_stream(
+        self,
+        conversation_history: List[genai_types.Content],
+        tool_config: Optional[genai_types.GenerateContentConfig]
+    ) -> AsyncIterator[genai_types.GenerateContentResponse]:
+        """Like generate_response, but yields the response chunks as they arrive."""
+        service_log_info(f"Sending streaming request to LLM model: {self.model_name}. History length: {len(conversation_history)}.")
+        debug_enabled = is_debug_enabled()
+        if debug_enabled:
+            service_log_debug("LLM request contents (last message): %s", conversation_history[-1] if conversation_history else 'None')
+            if tool_config:
+                service_log_debug("LLM tool_config: tools=%s", self._tool_names_for_log(tool_config))
+
+        try:
+            stream = await self.genai_client.aio.models.generate_content_stream(
+                model=self.model_name,
+                contents=conversation_history,
+                config=tool_config
+            )
+            async for chunk in stream:
+                if debug_enabled:
+                    service_log_debug("LLM stream chunk: %s...", str(chunk)[:500])
+                yield chunk
+            service_log_info(f"LLM API stream finished for model {self.model_name}.")
+        except Exception as e:
+            service_log_error(f"Error calling Gemini API ({self.model_name}): {e}", exc_info=True)
+            raise